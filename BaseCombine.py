@@ -11,9 +11,20 @@ class BaseCombine:
                          (for old fluxes)
         -- other_fluxes(): add other ND (neutrino), FD (any), HC (neutrino) fluxes
                          (for old fluxes)
+        -- close(): write all fluxes and close root-file of mode
     """
-    def __init__(self, params):
+    def __init__(self, params, mode_file=None):
+        """
+        Args:
+            params (dict): mode and FormFile parameters
+            mode_file (object): FormFile-like object instead of FormFile 
+                                (see ParallelCombine.TaskRecorder)
+        """
         self.params = params   
+        # one output file for all fluxes of mode
+        if mode_file is None:
+            mode_file = FormFile(**self.params['FormFile_PARAM'])
+        self.mode_file = mode_file
 
     def _combine_fluxes_(self, suffix, input_fluxes, add_HCs):
         """
@@ -22,20 +33,13 @@ class BaseCombine:
             input_other (dict): ND/FD/HC fluxes
             add_HCs (func): particular type of function for HCs
         """
-        mode_file = FormFile(**self.params['FormFile_PARAM'])
-
         if self.params['mode'] == 'neutrino':
-            mode_file.add("ND", "ND_" + suffix, "2D", input_fluxes['ND_hist'])
+            self.mode_file.add("ND", "ND_" + suffix, "2D", input_fluxes['ND_hist'])
 
-        mode_file.add("FD", "FD_" + suffix, "1D", input_fluxes['FD_hist'])
-        mode_file.close()
+        self.mode_file.add("FD", "FD_" + suffix, "1D", input_fluxes['FD_hist'])
 
         if self.params['mode'] == 'neutrino':
-            # it is necessary to open again
-            mode_file_HC = FormFile(**self.params['FormFile_PARAM'])
-            add_HCs(mode_file_HC, input_fluxes['HC_params'])
-
-            mode_file_HC.close()
+            add_HCs(self.mode_file, input_fluxes['HC_params'])
 
     
     def nom_fluxes(self, input_nom):
@@ -82,3 +86,7 @@ class BaseCombine:
         changing = lambda x, y: x.HC_other_old(*y)
         input_other['HC_params'] = ("ND", "HC_" + suffix, input_other['HC_hist'])
         self._combine_fluxes_(suffix, input_other, changing)
+
+    def close(self):
+        """ write all added fluxes (see FormFile.flush()) and close file """
+        self.mode_file.close()
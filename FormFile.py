@@ -1,5 +1,35 @@
-from ROOT import TFile, TH2D, TH1D, TList
+from ROOT import TFile, TH2D, TH1D, TList, SetOwnership
 import numpy as np
+import functools
+import json
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "linearComb"))
+from root_arrays import root_contents, root_errors, root_to_cells, root_axis_edges, find_bins
+
+
+def _hist_cells_(hist):
+    """contents and errors of TH1D/TH2D with under/overflow bins
+    Returns:
+        flux, err (array): (NbinsX + 2, NbinsY + 2), [xNum, yNum] as in ROOT
+    """
+    return root_contents(hist, flow=True), root_errors(hist, flow=True)
+
+def _axis_centers_(axis):
+    edges = root_axis_edges(axis)
+    return 0.5*(edges[:-1] + edges[1:])
+
+def _incremental_(method):
+    """skip FormFile method if its output hist is fresh (see FormFile.is_fresh()),
+       record it in manifest otherwise
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        if self.is_fresh(method.__name__, args):
+            return
+        method(self, *args)
+        self.record(method.__name__, args)
+    return wrapper
 
 
 class FormFile:
@@ -12,11 +42,45 @@ class FormFile:
         -- HC_other_new(): create other HC flux for new set
            _read()_: read hist
         -- HC_other_old(): create other HC flux for old set
-           _read()_: read hist
-        -- close(): close output file
+           _read()_: read hist (nominal hists are read once, see nominal_hists)
+           _input_file_(): open input file once (see input_files)
+        -- flush(): write queued hists in output file, directory by directory
+           _write_(): queue hist for output file
+           _columns_(): contents, errors and bin edges of hist for columnar file
+        -- is_fresh(): is hist in output file made from the same inputs and parameters
+        -- record(): remember inputs and parameters of hist in manifest
+           _manifest_entry_(): key and manifest entry of hist
+        -- close(): flush and close output file (and write columnar file and manifest)
+
+    add() and HC_other_*() are skipped for fresh hists (incremental=True).
     """    
-    def __init__(self, output_file, cut=False, scale=0, add_bin=0, **kwargs):
-        self.output_file = TFile(output_file, "update")
+    def __init__(self, output_file, cut=False, scale=0, add_bin=0, columnar=False, 
+                 incremental=True, **kwargs):
+        # None: hists are only queued (see pending), e.g. in workers of ParallelCombine
+        self.output_file = TFile(output_file, "update") if output_file else None
+        # parameters of hists in manifest
+        self.params = dict(cut=cut, scale=scale, add_bin=add_bin, columnar=columnar, **kwargs)
+        # manifest: {"<directory>/<name>": {method, args, params, inputs}}
+        # in .manifest.json next to output file
+        self.manifest_file = None
+        self.manifest = {}
+        if incremental and output_file:
+            self.manifest_file = os.path.splitext(output_file)[0] + ".manifest.json"
+            if os.path.exists(self.manifest_file):
+                with open(self.manifest_file) as manifest:
+                    self.manifest = json.load(manifest)
+        # columnar: hists are also saved in .npz next to output file:
+        # {"<directory>/<name>/contents" (errors, xedges, yedges): array}
+        self.columnar_file = None
+        if columnar and output_file:
+            self.columnar_file = os.path.splitext(output_file)[0] + ".npz"
+        self.columns = {}
+        # open input files: {path: TFile}
+        self.input_files = {}
+        # read and changed nominal hists: {(hist type, path, hist name): hist}
+        self.nominal_hists = {}
+        # hists to write: {directory: {name: hist}}
+        self.pending = {}
         
         self.cut = cut
         if self.cut:
@@ -28,6 +92,7 @@ class FormFile:
         self.add_bin = add_bin
 
 
+    @_incremental_
     def add(self, detector_name, output_hist_name, output_hist_type, 
                   input_hist: tuple):
         """read hist,
@@ -42,24 +107,8 @@ class FormFile:
         assert (output_hist_type != "1D" or output_hist_type != "2D"), f"{output_hist_type}" 
         assert isinstance(input_hist, tuple), f"3 arg is tuple"
 
-        input_file_path = input_hist[0]
-        input_hist_name = input_hist[1]
-        input_file = TFile(input_file_path, "read")
-        hist = input_file.Get(input_hist_name)
-
-        if self.cut:
-            title = input_file.GetName().split("/")[-1].split(".root")[0]
-            hist = self._cut_ranges_(hist, output_hist_type, title) 
-        if self.scale:
-            hist = self._scale_(hist, output_hist_type)
-
-        # write in output_file
-        if not self.output_file.GetDirectory(detector_name + ";1"):
-            self.output_file.mkdir(detector_name)
-
-        self.output_file.cd(detector_name + ";1")
-        hist.Write(output_hist_name, option=2)
-        input_file.Close()   
+        hist = self._read_(output_hist_type, input_hist)
+        self._write_(detector_name, output_hist_name, hist)
         
 
     def _cut_ranges_(self, hist, hist_type, title):
@@ -70,6 +119,7 @@ class FormFile:
             title: title of cutted hist
         Returns:
             cut_hist: cutted, *divided by width in GeV* hist
+                      (errors are divided by width too)
         """
         TAX = hist.GetXaxis()
         TAY = hist.GetYaxis()
@@ -77,28 +127,26 @@ class FormFile:
         xMinBin = TAX.FindBin(self.ERange[0])
         xMaxBin = TAX.FindBin(self.ERange[1])
         xBins = xMaxBin - xMinBin
+        xNums = np.arange(xMinBin, xMaxBin)
+
+        # (NbinsX + 2, NbinsY + 2) with under/overflow, [xNum, yNum] as in ROOT
+        flux, err = _hist_cells_(hist)
+        energy = _axis_centers_(TAX)[xNums - 1]
 
         if hist_type == "1D":
-            shape = [xBins]
-            flux = np.ndarray(shape)
-            err = np.ndarray(shape)
-            if self.DivWidthGeV:
-                width = np.ndarray(shape)
-            energy = np.ndarray(shape[0])
-            
             cut_hist = TH1D(title, title, 
-                            shape[0], self.ERange[0], self.ERange[1])
-
-            for i, xNum in enumerate(range(xMinBin, xMaxBin)):
-                    energy[i] = TAX.GetBinCenter(xNum)
-                    flux[i] = hist.GetBinContent(xNum)
-                    if self.DivWidthGeV:
-                        width[i] = hist.GetBinWidth(xNum)
-                        flux[i] = flux[i]/width[i]
-                        yNameAdd = " / GeV"
-                    err[i] = hist.GetBinError(xNum)
-                    cut_hist.Fill(energy[i], flux[i])
-                    cut_hist.SetBinError(xNum, err[i])
+                            xBins, self.ERange[0], self.ERange[1])
+            
+            flux = flux[xNums, 0]
+            err = err[xNums, 0]
+            if self.DivWidthGeV:
+                width = np.diff(root_axis_edges(TAX))[xNums - 1]
+                flux = flux/width
+                err = err/width
+                yNameAdd = " / GeV"
+            # bins of cut_hist as in cut_hist.Fill(energy, flux)
+            index = (find_bins(energy, xBins, *self.ERange), 
+                     np.zeros(xBins, dtype=int))
 
             yLabel = TAY.GetTitle()
             if self.DivWidthGeV:
@@ -111,33 +159,28 @@ class FormFile:
             yMinBin = TAY.FindBin(self.LocRange[0])
             yMaxBin = TAY.FindBin(self.LocRange[1])
             yBins = yMaxBin - yMinBin
+            yNums = np.arange(yMinBin, yMaxBin)
 
             # !!! problem with bin !!!
             if self.add_bin == 1:
                 yBins += 1 
 
-            shape = [xBins, yBins]
-            flux = np.ndarray(shape)
-            err = np.ndarray(shape)
-            if self.DivWidthGeV:
-                width = np.ndarray(shape[0])
-            energy = np.ndarray(shape[0])
-            loc = np.ndarray(shape[1])
-            
             cut_hist = TH2D(title, title, 
-                            shape[0], self.ERange[0], self.ERange[1], 
-                            shape[1], self.LocRange[0], self.LocRange[1])
-            for j, yNum in enumerate(range(yMinBin, yMaxBin)):
-                for i, xNum in enumerate(range(xMinBin, xMaxBin)):
-                    energy[i] = TAX.GetBinCenter(xNum)
-                    loc[j] = TAY.GetBinCenter(yNum)
-                    flux[i,j] = hist.GetBinContent(xNum, yNum)
-                    if self.DivWidthGeV:
-                        width[i] = TAX.GetBinWidth(xNum)
-                        flux[i, j] = flux[i, j]/width[i]
-                        zNameAdd = " / GeV"
-                    err[i,j] = hist.GetBinError(xNum, yNum)
-                    cut_hist.Fill(energy[i], loc[j], flux[i,j])
+                            xBins, self.ERange[0], self.ERange[1], 
+                            yBins, self.LocRange[0], self.LocRange[1])
+
+            loc = _axis_centers_(TAY)[yNums - 1]
+            flux = flux[np.ix_(xNums, yNums)]
+            err = err[np.ix_(xNums, yNums)]
+            if self.DivWidthGeV:
+                width = np.diff(root_axis_edges(TAX))[xNums - 1]
+                flux = flux/width[:, None]
+                err = err/width[:, None]
+                zNameAdd = " / GeV"
+            # bins of cut_hist as in cut_hist.Fill(energy, loc, flux)
+            index = np.ix_(find_bins(energy, xBins, *self.ERange), 
+                           find_bins(loc, yBins, *self.LocRange))
+
             yLabel = TAY.GetTitle()
             zLabel = TAZ.GetTitle()
             cut_hist.GetYaxis().SetTitle(yLabel)
@@ -147,6 +190,17 @@ class FormFile:
             else:                
                 cut_hist.GetZaxis().SetTitle(zLabel)
 
+        # bins filled by several initial bins are summed, errors in quadrature
+        cut_flux = np.zeros((cut_hist.GetNbinsX() + 2, 
+                             cut_hist.GetNbinsY() + 2 if hist_type == "2D" else 1))
+        cut_err2 = np.zeros_like(cut_flux)
+        np.add.at(cut_flux, index, flux)
+        np.add.at(cut_err2, index, err**2)
+        cut_hist.SetContent(root_to_cells(cut_flux))
+        cut_hist.SetError(root_to_cells(np.sqrt(cut_err2)))
+        cut_hist.ResetStats()
+        cut_hist.SetEntries(flux.size)
+
         xLabel = TAX.GetTitle()
         cut_hist.GetXaxis().SetTitle(xLabel)
         return cut_hist
@@ -168,6 +222,7 @@ class FormFile:
         return hist
 
 
+    @_incremental_
     def HC_other_new(self, detector_name, output_hist_name, input_hist_type, 
                            input_hists: tuple):
         """divide 1D shifted and nominal ND fluxes,
@@ -182,33 +237,17 @@ class FormFile:
                                       nominal 1D HC hist
         """
 
-        input_file_path, input_hist_name = input_hists[0]
-        old_norm_file_path, old_norm_hist_name = input_hists[1]
-        new_norm_file_path, new_norm_hist_name = input_hists[2]
-
-        input_file = TFile(input_file_path, "read")
-        output_hist = self._read_(input_hist_type, input_file, input_hist_name)
-
-        old_norm_file = TFile(old_norm_file_path, "read")
-        old_norm_hist = self._read_(input_hist_type, old_norm_file, old_norm_hist_name)
-
-        new_norm_file = TFile(new_norm_file_path, "read")
-        new_norm_hist = self._read_(input_hist_type, new_norm_file, new_norm_hist_name)
+        output_hist = self._read_(input_hist_type, input_hists[0])
+        old_norm_hist = self._read_(input_hist_type, input_hists[1], cache=True)
+        new_norm_hist = self._read_(input_hist_type, input_hists[2], cache=True)
         
         output_hist.Divide(old_norm_hist)
         output_hist.Multiply(new_norm_hist)
 
-        # write in output_file
-        if not self.output_file.GetDirectory(detector_name + ";1"):
-            self.output_file.mkdir(detector_name)
-
-        self.output_file.cd(detector_name + ";1") 
-        output_hist.Write(output_hist_name, option=2)
-        old_norm_file.Close()        
-        new_norm_file.Close()
-        input_file.Close()
+        self._write_(detector_name, output_hist_name, output_hist)
 
 
+    @_incremental_
     def HC_other_old(self, detector_name, output_hist_name,
                            input_hists: tuple):
         """divide 2D shifted and nominal ND fluxes,
@@ -223,18 +262,9 @@ class FormFile:
         Func:
            _read_(): take hist and *change* it
         """
-        input_file_path, input_hist_name = input_hists[0]
-        old_norm_file_path, old_norm_hist_name = input_hists[1]
-        new_norm_file_path, new_norm_hist_name = input_hists[2]
-
-        input_file = TFile(input_file_path, "read")
-        output_hist = self._read_("2D", input_file, input_hist_name)
-
-        old_norm_file = TFile(old_norm_file_path, "read")
-        old_norm_hist = self._read_("2D", old_norm_file, old_norm_hist_name)
-
-        new_norm_file = TFile(new_norm_file_path, "read")
-        new_norm_hist = self._read_("1D", new_norm_file, new_norm_hist_name)
+        output_hist = self._read_("2D", input_hists[0])
+        old_norm_hist = self._read_("2D", input_hists[1], cache=True)
+        new_norm_hist = self._read_("1D", input_hists[2], cache=True)
         
         output_hist.Divide(old_norm_hist)
 
@@ -261,26 +291,150 @@ class FormFile:
         hist_sh.GetXaxis().SetTitle(xtit)
         hist_sh.GetYaxis().SetTitle(ytit)
 
-        # write in output_file
-        if not self.output_file.GetDirectory(detector_name + ";1"):
-            self.output_file.mkdir(detector_name)
+        self._write_(detector_name, output_hist_name, hist_sh)
 
-        self.output_file.cd(detector_name + ";1") 
-        hist_sh.Write(output_hist_name, option=2)
-        old_norm_file.Close()        
-        new_norm_file.Close()
-        input_file.Close()
+    def _read_(self, d_type, input_hist, cache=False):
+        """read hist and *change* it
+        Args:
+            d_type (str): 1D/2D
+            input_hist (tuple): input file path and hist name
+            cache (bool): keep hist for next calls (for nominal hists, 
+                          which must not be changed by caller)
+        Returns:
+            hist: detached from input file
+        """
+        key = (d_type,) + tuple(input_hist)
+        if cache and key in self.nominal_hists:
+            return self.nominal_hists[key]
 
-    def _read_(self, d_type, i_file, h_name):
-            hist = i_file.Get(h_name)
+        input_file_path, input_hist_name = input_hist
+        i_file = self._input_file_(input_file_path)
+        hist = i_file.Get(input_hist_name)
+        # detach: the next Get() reads a new copy, python deletes this one
+        hist.SetDirectory(0)
+        SetOwnership(hist, True)
+
+        if self.cut:
+            title = i_file.GetName().split("/")[-1].split(".root")[0]
+            hist = self._cut_ranges_(hist, d_type, title) 
+            hist.SetDirectory(0)
+        if self.scale:
+            hist = self._scale_(hist, d_type)
+
+        if cache:
+            self.nominal_hists[key] = hist
+        return hist
 
-            if self.cut:
-                title = i_file.GetName().split("/")[-1].split(".root")[0]
-                hist = self._cut_ranges_(hist, d_type, title) 
-            if self.scale:
-                hist = self._scale_(hist, d_type)
-    
-            return hist
+    def _input_file_(self, input_file_path):
+        """ input file opened once for life of FormFile """
+        if input_file_path not in self.input_files:
+            self.input_files[input_file_path] = TFile(input_file_path, "read")
+        return self.input_files[input_file_path]
+
+    def _write_(self, detector_name, output_hist_name, hist):
+        """queue hist for flush(); 
+           it is detached from files, so input files can be closed
+        """
+        hist.SetDirectory(0)
+        self.pending.setdefault(detector_name, {})[output_hist_name] = hist
+
+    def flush(self):
+        """write queued hists: one mkdir/cd per directory, 
+           hists are overwritten (no new ;N cycles)
+        """
+        for detector_name, hists in self.pending.items():
+            if not self.output_file.GetDirectory(detector_name):
+                self.output_file.mkdir(detector_name)
+
+            self.output_file.cd(detector_name)
+            for output_hist_name, hist in hists.items():
+                hist.Write(output_hist_name, option=2)
+                if self.columnar_file:
+                    self.columns.update(self._columns_(detector_name + "/" + output_hist_name, hist))
+        self.pending = {}
+
+    def _columns_(self, key, hist):
+        flux, err = _hist_cells_(hist)
+        if hist.GetDimension() == 1:
+            flux, err = flux[1:-1, 0], err[1:-1, 0]
+        else:
+            flux, err = flux[1:-1, 1:-1], err[1:-1, 1:-1]
+        return {key + "/contents": flux,
+                key + "/errors": err,
+                key + "/xedges": root_axis_edges(hist.GetXaxis()),
+                key + "/yedges": root_axis_edges(hist.GetYaxis())}
+
+    def _write_columnar_(self):
+        """ update .npz file: the columns of the other hists are kept """
+        columns = {}
+        if os.path.exists(self.columnar_file):
+            with np.load(self.columnar_file) as old_columns:
+                columns.update(old_columns)
+        columns.update(self.columns)
+
+        tmp_file = self.columnar_file + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_file, "wb") as tmp:
+            np.savez(tmp, **columns)
+        os.replace(tmp_file, self.columnar_file)
+        self.columns = {}
+
+    def _manifest_entry_(self, method, args):
+        """
+        Args:
+            method (str): add/HC_other_new/HC_other_old
+            args (tuple): its arguments
+        Returns:
+            key (str): "<directory>/<name>" of output hist
+            entry (dict): method, other args, FormFile parameters, 
+                          input files (path, hist, mtime_ns, size)
+        """
+        detector_name, output_hist_name = args[:2]
+        input_hists = args[-1]
+        if isinstance(input_hists[0], str):
+            input_hists = (input_hists,)
+
+        inputs = []
+        for input_file_path, input_hist_name in input_hists:
+            stat = os.stat(input_file_path)
+            inputs.append(dict(path=os.path.abspath(input_file_path), hist=input_hist_name,
+                               mtime_ns=stat.st_mtime_ns, size=stat.st_size))
+
+        entry = dict(method=method, args=args[2:-1], params=self.params, inputs=inputs)
+        # as it is after json
+        return detector_name + "/" + output_hist_name, json.loads(json.dumps(entry))
+
+    def is_fresh(self, method, args):
+        """hist is in output file and its manifest entry is the same 
+           (inputs are not changed, see _manifest_entry_())
+        """
+        if not self.manifest_file:
+            return False
+        key, entry = self._manifest_entry_(method, args)
+        if self.manifest.get(key) != entry:
+            return False
+
+        detector_name, output_hist_name = args[:2]
+        directory = self.output_file.GetDirectory(detector_name)
+        return bool(directory) and bool(directory.GetListOfKeys().FindObject(output_hist_name))
+
+    def record(self, method, args):
+        """ manifest is written in close() """
+        if self.manifest_file:
+            key, entry = self._manifest_entry_(method, args)
+            self.manifest[key] = entry
 
     def close(self):
-        self.output_file.Close()               
+        if self.output_file:
+            self.flush()
+            self.output_file.Close()
+            if self.columnar_file:
+                self._write_columnar_()
+            if self.manifest_file:
+                tmp_file = self.manifest_file + "." + str(os.getpid()) + ".tmp"
+                with open(tmp_file, "w") as tmp:
+                    json.dump(self.manifest, tmp, indent=1)
+                os.replace(tmp_file, self.manifest_file)
+        for input_file in self.input_files.values():
+            input_file.Close()
+        self.input_files = {}
+        self.nominal_hists = {}               
@@ -1,6 +1,8 @@
 from FormFile import FormFile
 from BaseCombine import BaseCombine
+from ParallelCombine import run_modes, default_jobs
 import os
+import sys
 
 class Combine_300_285(BaseCombine):
     """inherit from BaseCombine
@@ -9,8 +11,8 @@ class Combine_300_285(BaseCombine):
        other_fluxes(): x.HC_other_old -> x.HC_other_new 
                        (change other_fluxes() from BaseCombine)
     """
-    def __init__(self, params):
-        super().__init__(params)
+    def __init__(self, params, **kwargs):
+        super().__init__(params, **kwargs)
 
     def other_fluxes(self, shift, sigma_type, input_other):
         suffix = shift + "_" + sigma_type + "_1_sigma"
@@ -19,55 +21,63 @@ class Combine_300_285(BaseCombine):
         input_other['HC_params'] = ("ND", "HC_" + suffix, "1D", input_other['HC_hist'])
         self._combine_fluxes_(suffix, input_other, changing)
 
-def main():
-    mode_param = dict(neutrino=('nu',), antineutrino=('nubar',))          
-    for mode in mode_param.keys():
-        flavor = mode_param[mode][0]
+mode_param = dict(neutrino=('nu',), antineutrino=('nubar',))          
 
-        FormFile_PARAM = dict(output_file="outputs/" + mode + "_range_300_285.root", 
-                              cut=True, ERange=[0., 8.], LocRange=[0, 33],
-                              DivWidthGeV=True, scale=0.0001, add_bin=1)
-        params = dict(mode=mode, FormFile_PARAM=FormFile_PARAM)
-        com_file = Combine_300_285(params)
+def mode_params(mode):
+    FormFile_PARAM = dict(output_file="outputs/" + mode + "_range_300_285.root", 
+                          cut=True, ERange=[0., 8.], LocRange=[0, 33],
+                          DivWidthGeV=True, scale=0.0001, add_bin=1, columnar=True)
+    params = dict(mode=mode, FormFile_PARAM=FormFile_PARAM)
+    return params
 
-        # nominal fluxes
-        nominal_file_name = os.path.join(mode, "OfficialEngDesignSept2021_" + mode)
-        nom_HC_file_name = os.path.join(mode, "HornCurrent285kAforPRISM_nominal_" + mode + "_finemc.root")
-        input_nom = dict(
-            ND_hist=(nominal_file_name + "_LAr_center.root",          
-                     "Unosc_numu_flux_DUNEPRISM_LAr_center"),
-            FD_hist=(nominal_file_name + "_finemc.root", "Unosc_flux_numu_finemc_DUNEFD"),
-            HC_hist=(nom_HC_file_name, "Unosc_flux_numu_finemc_DUNEND"))
+def fill_mode(com_file, mode):
+    flavor = mode_param[mode][0]
 
-        com_file.nom_fluxes(input_nom)
+    # nominal fluxes
+    nominal_file_name = os.path.join(mode, "OfficialEngDesignSept2021_" + mode)
+    nom_HC_file_name = os.path.join(mode, "HornCurrent285kAforPRISM_nominal_" + mode + "_finemc.root")
+    input_nom = dict(
+        ND_hist=(nominal_file_name + "_LAr_center.root",          
+                 "Unosc_numu_flux_DUNEPRISM_LAr_center"),
+        FD_hist=(nominal_file_name + "_finemc.root", "Unosc_flux_numu_finemc_DUNEFD"),
+        HC_hist=(nom_HC_file_name, "Unosc_flux_numu_finemc_DUNEND"))
 
-        # ppfx fluxes: see linearComb/flux_fitter.py -> 
-        #                  load_FD_ppfx_shifts()/load_ND_ppfx_shifts()
+    com_file.nom_fluxes(input_nom)
 
-        # other shifts
-        def set_input_other(shift, sigma_type):
-            shift_hist = shift + "_" + sigma_type + "_1_sigma"
-            other_file_name = os.path.join(mode, shift_hist + "_" + mode)
-            input_other = dict(
-              ND_hist=(other_file_name + "_LAr_center.root",
-                             "Unosc_numu_flux_DUNEPRISM_LAr_center"),
-              FD_hist=(other_file_name + "_finemc.root", "Unosc_flux_numu_finemc_DUNEFD"),
-              HC_hist=((os.path.join(mode, shift_hist + "_" + mode + "_finemc.root"),
-                        "Unosc_flux_numu_finemc_DUNEND"),
-                       (os.path.join(mode, "OfficialEngDesignSept2021_" + mode + "_finemc.root"),
-                         "Unosc_flux_numu_finemc_DUNEND"),
-                       (os.path.join(mode, "HornCurrent285kAforPRISM_nominal_" + mode + "_finemc.root"),
-                         "Unosc_flux_numu_finemc_DUNEND")))
-            return input_other
+    # ppfx fluxes: see linearComb/flux_fitter.py -> 
+    #                  load_FD_ppfx_shifts()/load_ND_ppfx_shifts()
 
-        shifts = ['DecayPipeRadius', 'HornWaterLayerThickness', 'HornCurrent', 'ProtonBeamRadius']
-        sigma_types = ['pos', 'neg']
+    # other shifts
+    def set_input_other(shift, sigma_type):
+        shift_hist = shift + "_" + sigma_type + "_1_sigma"
+        other_file_name = os.path.join(mode, shift_hist + "_" + mode)
+        input_other = dict(
+          ND_hist=(other_file_name + "_LAr_center.root",
+                         "Unosc_numu_flux_DUNEPRISM_LAr_center"),
+          FD_hist=(other_file_name + "_finemc.root", "Unosc_flux_numu_finemc_DUNEFD"),
+          HC_hist=((os.path.join(mode, shift_hist + "_" + mode + "_finemc.root"),
+                    "Unosc_flux_numu_finemc_DUNEND"),
+                   (os.path.join(mode, "OfficialEngDesignSept2021_" + mode + "_finemc.root"),
+                     "Unosc_flux_numu_finemc_DUNEND"),
+                   (os.path.join(mode, "HornCurrent285kAforPRISM_nominal_" + mode + "_finemc.root"),
+                     "Unosc_flux_numu_finemc_DUNEND")))
+        return input_other
 
-        for shift in shifts:
-            for sigma_type in sigma_types:
-                input_other = set_input_other(shift, sigma_type)
-                com_file.other_fluxes(shift, sigma_type, input_other)
+    shifts = ['DecayPipeRadius', 'HornWaterLayerThickness', 'HornCurrent', 'ProtonBeamRadius']
+    sigma_types = ['pos', 'neg']
 
-if __name__ == "__main__":
-    main()
+    for shift in shifts:
+        for sigma_type in sigma_types:
+            input_other = set_input_other(shift, sigma_type)
+            com_file.other_fluxes(shift, sigma_type, input_other)
 
+def main(jobs=None):
+    """
+    Args:
+        jobs (int): number of processes (INIT_JOBS or number of cores by default),
+                    1 - sequential
+    """
+    run_modes(Combine_300_285, mode_params, fill_mode, list(mode_param.keys()), jobs)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else default_jobs())
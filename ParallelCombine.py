@@ -0,0 +1,122 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing as mp
+import numpy as np
+import os
+
+from FormFile import FormFile
+
+
+class TaskRecorder:
+    """stand-in for FormFile in BaseCombine:
+       FormFile calls are recorded and run later by workers
+
+    Methods:
+        -- add(), HC_other_new(), HC_other_old(): record call of FormFile
+        -- close(): nothing to close
+    """
+    def __init__(self):
+        # [(FormFile method, args)]
+        self.tasks = []
+
+    def add(self, *args):
+        self.tasks.append(("add", args))
+
+    def HC_other_new(self, *args):
+        self.tasks.append(("HC_other_new", args))
+
+    def HC_other_old(self, *args):
+        self.tasks.append(("HC_other_old", args))
+
+    def close(self):
+        pass
+
+
+# FormFile of worker for every mode (input files and nominal hists are kept
+# between chunks): {output file: FormFile}
+_worker_files = {}
+
+def _run_tasks_(FormFile_PARAM, tasks):
+    """run recorded FormFile calls in worker
+    Args:
+        FormFile_PARAM (dict): FormFile parameters of mode
+        tasks (list): [(FormFile method, args)]
+    Returns:
+        pending (dict): {directory: {name: hist}} to write in output file
+    """
+    output_file = FormFile_PARAM['output_file']
+    if output_file not in _worker_files:
+        _worker_files[output_file] = FormFile(**dict(FormFile_PARAM, output_file=None))
+    mode_file = _worker_files[output_file]
+
+    for method, args in tasks:
+        getattr(mode_file, method)(*args)
+
+    pending = mode_file.pending
+    mode_file.pending = {}
+    return pending
+
+
+def default_jobs():
+    """ number of workers: INIT_JOBS or number of cores """
+    return int(os.environ.get("INIT_JOBS", os.cpu_count()))
+
+
+def run_modes(combine_class, mode_params, fill_mode, modes, jobs=None):
+    """build root-files of modes:
+       calls of FormFile are recorded for every mode (see TaskRecorder),
+       hists are made in process pool,
+       this process is the only writer of every output file,
+       fresh hists are skipped (see FormFile.is_fresh())
+
+    Args:
+        combine_class (class): BaseCombine or inherited class
+        mode_params (func): mode -> params of combine_class
+        fill_mode (func): (combine_class object, mode) -> None,
+                          adds fluxes of mode
+        modes (list): neutrino, antineutrino
+        jobs (int): number of workers, 1 - without process pool
+    """
+    jobs = jobs or default_jobs()
+
+    if jobs == 1:
+        for mode in modes:
+            combine = combine_class(mode_params(mode))
+            fill_mode(combine, mode)
+            combine.close()
+        return
+
+    # record tasks of all modes, skip fresh hists, split them to chunks
+    chunks = []
+    mode_files = {}
+    for mode in modes:
+        params = mode_params(mode)
+        recorder = TaskRecorder()
+        fill_mode(combine_class(params, mode_file=recorder), mode)
+
+        mode_files[mode] = FormFile(**params['FormFile_PARAM'])
+        stale = [task for task in recorder.tasks if not mode_files[mode].is_fresh(*task)]
+        print(f"{mode} mode: {len(stale)} of {len(recorder.tasks)} hists to make")
+
+        nChunks = min(len(stale), 2*jobs)
+        for chunk in np.array_split(np.arange(len(stale)), nChunks) if stale else []:
+            tasks = [stale[i] for i in chunk]
+            chunks.append((mode, params['FormFile_PARAM'], tasks))
+
+    # ROOT is not fork-safe
+    context = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+        futures = {pool.submit(_run_tasks_, FormFile_PARAM, tasks):
+                   (mode, tasks)
+                   for mode, FormFile_PARAM, tasks in chunks}
+
+        for future in as_completed(futures):
+            mode, tasks = futures[future]
+            for detector_name, hists in future.result().items():
+                for output_hist_name, hist in hists.items():
+                    mode_files[mode]._write_(detector_name, output_hist_name, hist)
+            for method, args in tasks:
+                mode_files[mode].record(method, args)
+
+    for mode, mode_file in mode_files.items():
+        mode_file.close()
+        print(f"{mode} mode is done")
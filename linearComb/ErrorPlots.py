@@ -1,7 +1,14 @@
 import matplotlib.pyplot as plt
+import copy
 import os
 import utils
 import numpy as np
+from render import RenderQueue
+
+
+def shifted_page(plots, type_target, type_shifts, Nreb, ylim_F, ylim_R):
+    """ page of ErrorPlots.shifted_plots() for RenderQueue """
+    return plots.draw(type_target, type_shifts, Nreb, ylim_F, ylim_R)
 
 
 class ErrorPlots:
@@ -13,12 +20,13 @@ class ErrorPlots:
                        choose new/old data
         -- shifted_plots(): plot and save as pdf page consisted of 6 figures
             -- extract_fluxes()
-            -- add_nom_fluxes()
-            -- add_other_set()
-            -- add_ppfx_set()
-            -- axis_style()
-            -- fit_lines()
-            -- save()
+            -- draw(): make the page from extracted fluxes (without fitter)
+                -- add_nom_fluxes()
+                -- add_other_set()
+                -- add_ppfx_set()
+                -- axis_style()
+                -- fit_lines()
+            -- path()
     """
     def __init__(self, fitter):
         self.fitter = fitter
@@ -26,13 +34,21 @@ class ErrorPlots:
         self.Energy = fitter.Ebins
         self.EnergyEdges = fitter.EbinEdges
         self.Posc = self.fitter.Posc
+        self.nPpfxUniv = getattr(fitter, 'nPpfxUniv', 0)
 
         # draw fit region
         self.min_Ebound = fitter.Ebounds[0]
         self.max_Ebound = fitter.Ebounds[1]
 
+    def __getstate__(self):
+        # pages are drawn by workers without fitter and full shifted fluxes
+        state = self.__dict__.copy()
+        for name in ('fitter', 'fig', 'ND_shifts', 'FD_shifts'):
+            state.pop(name, None)
+        return state
+
     def shifted_plots(self, type_target, reg, type_shifts, 
-                            Nreb=False, ylim_F=False, ylim_R=[0,0,0]):
+                            Nreb=False, ylim_F=False, ylim_R=[0,0,0], queue=None):
         """
         Plot and save as pdf page consisted of 6 figures
 
@@ -51,11 +67,29 @@ class ErrorPlots:
             Nreb (int): rebin for add_other_set()
             ylim_F (float): y lim for flux plots
             ylim_R (list): y lim for ratio plots
+            queue (RenderQueue): add the page to the queue, save it right away if None
         """
 
         target, fluxPred, c = self.extract_fluxes(type_target, reg, type_shifts)
         self.target, self.fluxPred, self.c = target, fluxPred, c
 
+        render_now = queue is None
+        if render_now:
+            queue = RenderQueue(jobs=1)
+        # the page keeps arrays of this call only
+        queue.add(self.path(type_target, type_shifts), shifted_page, copy.copy(self),
+                  type_target, type_shifts, Nreb, ylim_F, ylim_R)
+        if render_now:
+            queue.run()
+
+    def draw(self, type_target, type_shifts, Nreb, ylim_F, ylim_R):
+        """
+        Make pdf page consisted of 6 figures from extract_fluxes() arrays
+
+        Returns:
+            fig (figure)
+        """
+
         self.fig, ((ax0, ax1, ax2), (ax3, ax4, ax5)) = plt.subplots(figsize=(16, 9), 
                                                                   nrows=2, ncols=3)
         if type_shifts == 'other':
@@ -68,7 +102,7 @@ class ErrorPlots:
         else:
             f_s = 'NEW'
 
-        plt.suptitle(title + ' uncertainies', fontsize=16)
+        self.fig.suptitle(title + ' uncertainies', fontsize=16)
         ax5.text(0.1, 0.9, 'Fluxes:  ' + f_s, fontsize=16)
         ax5.text(0.1, 0.8, r'Target: $\nu_{\mu}$ ' + type_target, fontsize=16)
 
@@ -90,7 +124,8 @@ class ErrorPlots:
         self.axis_style(ax3, type_shifts, 'nom', ylim_F=ylim_F)
         self.axis_style(ax4, type_shifts, 'shifts', ylim_F=ylim_F)
 
-        self.save(type_target, type_shifts)
+        self.fig.subplots_adjust(hspace=0.3, wspace=0.4, left=0.07, right=0.98)
+        return self.fig
 
     def extract_fluxes(self, type_target, reg, type_shifts):
         """
@@ -119,7 +154,7 @@ class ErrorPlots:
 
         if type_shifts == 'other':
             self.ND_shifts = self.fitter.ND_other_shifts
-            self.list_of_shifts = self.FD_shifts.keys()
+            self.list_of_shifts = list(self.FD_shifts.keys())
         elif type_shifts == 'ppfx':
             self.ND_shifts = self.fitter.ND_ppfx_shifts
             self.list_of_shifts = range(0, self.fitter.nPpfxUniv)
@@ -127,6 +162,10 @@ class ErrorPlots:
             raise Exception(f"Type of uncertainties is other/ppfx, not {type_others}")
 
         target, fluxPred, c = self.fitter.calc_coeffs(reg, self.FD_nom)
+
+        # shifted ND predictions and oscillated FD fluxes for all panels
+        _, self.ND_pred_shifts, self.FD_osc_shifts = self.fitter.propagate_shifts(c, type_shifts, 
+                                                                                  type_target)
         return target, fluxPred, c
 
     def add_nom_fluxes(self, ax):
@@ -155,18 +194,18 @@ class ErrorPlots:
             Nreb (int): N for rebin 
         """
 
-        def _add_shifted_fluxes(ax, shift, number_of_shift):
+        def _add_shifted_fluxes(ax, index, number_of_shift):
             # add shifted flux in the figure
-            ax.plot(self.Energy, np.dot(self.ND_shifts[shift], self.c),
+            ax.plot(self.Energy, self.ND_pred_shifts[index],
                                  label=str(number_of_shift))
 
-        def _add_ratio(ax, flux_type, shift, number_of_shift):
+        def _add_ratio(ax, flux_type, index, number_of_shift):
             """
             Add ratios
 
             Args:
                 flux_type (str): ND/FD/both
-                shift (str): HornCurrent/DecayPipe/...
+                index (int): index of shift in self.list_of_shifts
                 number_of_shift (int): 1, 2, ...
             """
 
@@ -181,14 +220,14 @@ class ErrorPlots:
                 """
 
                 if tp == "ND":
-                    x = (np.dot(self.ND_shifts[shift], self.c) - self.fluxPred)/self.FD_nom
+                    x = (self.ND_pred_shifts[index] - self.fluxPred)/self.FD_nom
                     return utils.average(x, Nreb) if Nreb else x
                 elif tp == "FD":
-                    x = (self.FD_shifts[shift] * self.Posc - self.target)/self.FD_nom
+                    x = (self.FD_osc_shifts[index] - self.target)/self.FD_nom
                     return utils.average(x, Nreb) if Nreb else x
                 elif tp == 'both':
-                    x = (np.dot(self.ND_shifts[shift], self.c) - self.fluxPred)/self.FD_nom
-                    y = (self.FD_shifts[shift] * self.Posc - self.target)/self.FD_nom
+                    x = (self.ND_pred_shifts[index] - self.fluxPred)/self.FD_nom
+                    y = (self.FD_osc_shifts[index] - self.target)/self.FD_nom
                     z = x - y
                     return utils.average(z, Nreb) if Nreb else z
                 else: 
@@ -217,12 +256,12 @@ class ErrorPlots:
             ax.text(-0.1, 0.7 - 0.1 * number_of_shift, self.shift_label, fontsize=14, color=color)
 
         number_of_shift = 0
-        for shift in self.list_of_shifts:
+        for index, shift in enumerate(self.list_of_shifts):
             number_of_shift += 1
-            _add_shifted_fluxes(ax4, shift, number_of_shift)
-            _add_ratio(ax0, 'ND', shift, number_of_shift)
-            _add_ratio(ax1, 'FD', shift, number_of_shift)
-            color = _add_ratio(ax2, 'both', shift, number_of_shift)
+            _add_shifted_fluxes(ax4, index, number_of_shift)
+            _add_ratio(ax0, 'ND', index, number_of_shift)
+            _add_ratio(ax1, 'FD', index, number_of_shift)
+            color = _add_ratio(ax2, 'both', index, number_of_shift)
             _ax5_legend(ax5, type_shifts, shift, number_of_shift, color)
 
 
@@ -243,7 +282,7 @@ class ErrorPlots:
 
         def _add_shifted_fluxes(ax):
             # add shifted flux in the figure. There is 68% flux band (1 sigma).
-            x = np.array([np.dot(self.ND_shifts[shift], self.c) for shift in self.list_of_shifts])
+            x = self.ND_pred_shifts
             mean_x = np.mean(x, axis=0)
             min_x = np.min(x, axis=0)
             max_x = np.max(x, axis=0)
@@ -270,7 +309,7 @@ class ErrorPlots:
                 """
 
                 if tp == 'ND':
-                    x = np.array([np.dot(self.ND_shifts[shift], self.c) for shift in self.list_of_shifts])
+                    x = self.ND_pred_shifts
                     mean_x = np.mean(x, axis=0)
                     min_x = np.min(x, axis=0)
                     max_x = np.max(x, axis=0)
@@ -284,7 +323,7 @@ class ErrorPlots:
 
                     return mean_r, min_r_68, max_r_68
                 elif tp == 'FD':
-                    x = np.array([(self.FD_shifts[shift] * self.Posc) for shift in self.list_of_shifts])
+                    x = self.FD_osc_shifts
                     mean_x = np.mean(x, axis=0)
                     min_x = np.min(x, axis=0)
                     max_x = np.max(x, axis=0)
@@ -298,9 +337,7 @@ class ErrorPlots:
 
                     return mean_r, min_r_68, max_r_68
                 elif tp == 'both':
-                    x = np.array([np.dot(self.ND_shifts[shift], self.c) for shift in self.list_of_shifts])
-                    y = np.array([(self.FD_shifts[shift] * self.Posc) for shift in self.list_of_shifts])
-                    z = x - y
+                    z = self.ND_pred_shifts - self.FD_osc_shifts
                     mean_z = np.mean(z, axis=0)
                     min_z = np.min(z, axis=0)
                     max_z = np.max(z, axis=0)   
@@ -320,7 +357,7 @@ class ErrorPlots:
 
         def _ax5_legend(ax):
             # add text in figure 5
-            shift_label = r'$1 \sigma$' +  f" band for {self.fitter.nPpfxUniv} PPFX throws"
+            shift_label = r'$1 \sigma$' +  f" band for {self.nPpfxUniv} PPFX throws"
 
             ax.set_axis_off()
             ax.text(-0.1, 0.5, shift_label, fontsize=16)
@@ -392,18 +429,12 @@ class ErrorPlots:
         ax.axvline(self.max_Ebound, color='red', linestyle='dashed', alpha=0.6)
 
 
-    def save(self, type_target, type_shifts):
-        # save figs in images/New(Old) dir
-        plt.subplots_adjust(hspace=0.3, wspace=0.4, left=0.07, right=0.98)
+    def path(self, type_target, type_shifts):
+        # pdf file in images/New(Old) dir
         if self.file_set == 'old':
             file_set = 'Old'
         else:
             file_set = 'New'
 
         dir_plt = os.path.join("images", file_set)
-        if not os.path.isdir(dir_plt):
-            os.mkdir(dir_plt)
-
-        path_name = os.path.join(dir_plt, type_target + '_' + type_shifts + "_" + self.file_set + ".pdf")
-        plt.savefig(path_name)
-        print(f"Saved {path_name}")
+        return os.path.join(dir_plt, type_target + '_' + type_shifts + "_" + self.file_set + ".pdf")
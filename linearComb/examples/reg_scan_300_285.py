@@ -0,0 +1,30 @@
+import sys
+sys.path.insert(0, ".")
+from flux_fitter import *
+
+
+# oscillation probability
+dcp = 0
+s23 = 0.53
+dm32 = 2.46e-3
+osc_hyp = oscProb("numu", "numu", s23 = s23, dm32 = dm32, dcp = dcp)
+
+# main class
+fitter = flux_fitter(oscParam = osc_hyp,
+                     file_set = '300_285',
+                     useHC = True,
+                     Erebin = 10,
+                     OArebin = 10)
+
+# fit range
+energies = [0.4, 3.865]
+fitter.set_fit_region(energies)
+weight = [0.8, 0]
+fitter.set_OOR(weight)
+
+# L-curve scan of the reg parameter for FHC and RHC targets
+regs = np.logspace(-12, -6, 1000)
+scan = fitter.scan_regularization(regs, ('FHC', 'RHC'))
+
+for type_target, reg_opt in zip(('FHC', 'RHC'), scan['reg_opt']):
+    print(f"{type_target}: optimal reg = {reg_opt:.2e}")
@@ -0,0 +1,38 @@
+import sys
+sys.path.insert(0, ".")
+from flux_fitter import *
+
+
+if __name__ == "__main__":
+    # oscillation probability
+    dcp = 0
+    s23 = 0.53
+    dm32 = 2.46e-3
+    osc_hyp = oscProb("numu", "numu", s23 = s23, dm32 = dm32, dcp = dcp)
+
+    # main class
+    fitter = flux_fitter(oscParam = osc_hyp,
+                         file_set = '300_285',
+                         useHC = True,
+                         Erebin = 10,
+                         OArebin = 10,
+                         other_loaded = True, 
+                         ppfx_loaded = True, 
+                         PpfxUniv = 100)
+
+    # grid of OA ranges, fit regions, OOR weights and reg parameters
+    oa_ranges = [[0, 20], [0, 26], [0, 33]]
+    fit_regions = [[0.4, 3.865], [0.5, 3.5]]
+    oor_weights = [[0.8, 0], [0.5, 0], [0, 0]]
+    regs = [1e-9, 4e-9, 1e-8]
+
+    table = fitter.scan(oa_ranges, fit_regions, oor_weights, regs, targets = ('FHC', 'RHC'))
+
+    # the best configuration for each target: the smallest residual in the fit region
+    for type_target in ('FHC', 'RHC'):
+        rows = [row for row in table if row['target'] == type_target]
+        best = min(rows, key = lambda row: row['residual_in'])
+        print(f"{type_target}: OA range {best['OA_range']}, fit region {best['fit_region']}, "
+              f"OOR {best['OOR']}, reg = {best['reg']:.1e}: "
+              f"residual {best['residual_in']:.3f} (out {best['residual_out']:.3f}), "
+              f"ppfx spread {best['spread']['ppfx']:.3f}")
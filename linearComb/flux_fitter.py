@@ -1,4 +1,8 @@
-from scipy.linalg import block_diag
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import multiprocessing as mp
+import os
+from scipy.linalg import block_diag, null_space
 from utils import *
 from fluxes import *
 from oscProbs import *
@@ -19,8 +23,13 @@ class flux_fitter:
         -- add_new_FD(): load new FD flux as a target
         -- set_fit_region(): a fit region to match
         -- set_OOR(): out of range weights 
-        -- set_cutOArange(): reload fluxes in new OA range
+        -- cut_OArange(): cut ND fluxes to new OA range (without reloading)
         -- calc_coeffs(): calculate coeffs and return target, LC, coeffs
+        -- calc_coeffs_batch(): the same for arrays of regs and targets
+        -- propagate_shifts(): ND predictions and oscillated FD fluxes for all shifts
+        -- scan_regularization(): L-curve scan and the optimal reg parameter
+        -- scan(): quality of the fit for a grid of OA ranges, fit regions, 
+                   OOR weights and reg parameters (in parallel)
     """
 
     def __init__(self, oscParam = None, 
@@ -36,18 +45,20 @@ class flux_fitter:
             -- Erebin (int) / OArebin (int): rebin E/OA bins
             -- other_loaded/ppfx_loaded (bool): load other/ppfx shifts or not
             -- **kwargs: PpfxUniv (int): 1...100
+                         PpfxMemmap (str): .npy file to keep ND ppfx univs on disk
         """
 
         self.f = file_set
 
         ## from fluxes.py
+        binning = axes(self.f)
         # set E range
-        self.Ebins = Ebins[self.f]  # central values of energy
-        self.EbinEdges = EbinEdges[self.f]
+        self.Ebins = binning["Ebins"]  # central values of energy
+        self.EbinEdges = binning["EbinEdges"]
 
         # set OA range
-        self.__OAbins = OAbins[self.f] # central values of OA positions
-        self.__OAbinEdges = OAbinEdges[self.f]
+        self.__OAbins = binning["OAbins"] # central values of OA positions
+        self.__OAbinEdges = binning["OAbinEdges"]
         if self.__OAbinEdges[0] < 0:
            print("WARNING! Using the OA position less than 0 m")
         
@@ -66,6 +77,18 @@ class flux_fitter:
         self.OABins = self.__OAbins
         self.OAEdges = self.__OAbinEdges
 
+        # ND fluxes are kept in the full OA range, 
+        # ND_nom, ND_HC_nom, ND_ppfx_shifts, ND_other_shifts are cut from them 
+        # (see _OA_cut() and cut_OArange())
+        self._OAslice = slice(0, len(self.__OAbins))
+        self._OAviews = {}
+
+        # ND hists of this file set have the binning of its nominal ND hist:
+        # they are rebinned by one Rebinner (ppfx hists come from another file set,
+        # see load_ND_ppfx_shifts())
+        self.ND_rebinner = Rebinner.for_axes((binning["Ebins"], binning["OAbins"]), 
+                                             (self.EbinEdges, self.__OAbinEdges))
+
         # use an additional HC
         self.useHC = useHC
         if not self.useHC:
@@ -82,13 +105,16 @@ class flux_fitter:
         # load nominal fluxes
         self.load_nom()
 
+        # see propagate_shifts()
+        self._propagated = {}
+
         # load shifted fluxes 
         self.ppfx_loaded = ppfx_loaded
         self.other_loaded = other_loaded
         self.load_shifts(**kwargs)
 
         # set default bounds for the fit
-        self.Ebounds = (0, Ebins[self.f][-1])
+        self.Ebounds = (0, binning["Ebins"][-1])
         self.OutOfRegionFactors = (0, 0)
 
         # are changed after set self.add_new_FD()
@@ -108,11 +134,12 @@ class flux_fitter:
         *load nominal additional 1D HC and add it to 2D ND flux*
         """
 
-        self.ND_nom = ND_nominal[self.f].load(binEdges = [self.EbinEdges, self.OAEdges])
+        self._OAviews = {}
+        self._ND_nom_full = ND_nominal[self.f].load(rebinner = self.ND_rebinner)
 
         if self.useHC:
             self.HC_nom = HC_nominal[self.f].load(binEdges = [self.EbinEdges])
-            self.ND_HC_nom = np.append(self.ND_nom.T, [self.HC_nom], axis=0).T
+            self._ND_HC_nom_full = np.append(self._ND_nom_full.T, [self.HC_nom], axis=0).T
 
     def load_nom(self):
         """
@@ -127,8 +154,9 @@ class flux_fitter:
         load other shifted 1D FD flux for each shift
         """
 
-        FD_other = {key: shift.load(binEdges = [self.EbinEdges])
-              for key, shift in FD_other_shifts[self.f].items()}
+        shifts = FD_other_shifts[self.f]
+        FD_other = dict(zip(shifts.keys(),
+                            load_many(list(shifts.values()), binEdges = [self.EbinEdges])))
         self.FD_other_shifts = FD_other   
         
     def load_ND_other_shifts(self):
@@ -137,18 +165,22 @@ class flux_fitter:
         *load other shifted additional 1D HC and add it to 2D ND flux for each shift*
         """
 
-        ND_other = {key: shift.load(binEdges = [self.EbinEdges, self.OAEdges])
-                          for key, shift in ND_other_shifts[self.f].items()}
-        self.ND_other_shifts = ND_other
+        self._OAviews = {}
+        shifts = ND_other_shifts[self.f]
+        ND_other = dict(zip(shifts.keys(),
+                            load_many(list(shifts.values()),
+                                      rebinner = self.ND_rebinner)))
+        self._ND_other_full = ND_other
 
         if self.useHC:
-            HC_other = {key: shift.load(binEdges = [self.EbinEdges])
-                  for key, shift in HC_other_shifts[self.f].items()}
+            shifts = HC_other_shifts[self.f]
+            HC_other = dict(zip(shifts.keys(),
+                                load_many(list(shifts.values()), binEdges = [self.EbinEdges])))
             self.HC_other_shifts = HC_other  
 
-            ND_other = {key: np.append(self.ND_other_shifts[key].T, [self.HC_other_shifts[key]], axis=0).T
+            ND_other = {key: np.append(self._ND_other_full[key].T, [self.HC_other_shifts[key]], axis=0).T
                              for key in ND_other_shifts[self.f].keys()}
-            self.ND_other_shifts = ND_other
+            self._ND_other_full = ND_other
 
     def load_FD_ppfx_shifts(self):
         """
@@ -165,8 +197,9 @@ class flux_fitter:
            name = 'old'
 
         FD_CV = FD_ppfx_CV[name].load(binEdges = [self.EbinEdges])
-        FD_ppfx = np.array([shift.load(binEdges = [self.EbinEdges])
-                                        for shift in FD_ppfx_univ[name][:nUniv]])
+        FD_ppfx = np.empty((nUniv, len(self.Ebins)))
+        load_many(FD_ppfx_univ[name][:nUniv], out = FD_ppfx,
+                  binEdges = [self.EbinEdges])
         FD_ppfx /= FD_CV
         FD_ppfx *= self.FD_nom
             
@@ -178,6 +211,9 @@ class flux_fitter:
         and normalize it on nominal 2D ND flux
         *load ppfx shifted additional 1D HC and add it to 2D ND flux for CV and each univ
         and normalize it on nominal 2D ND flux*
+
+        All univs are kept in one (nUniv, nE, nOA(+1)) array for the full OA range 
+        which is filled in place, the HC flux is written in the last OA column.
         """
 
         if self.f == 'old':
@@ -186,26 +222,45 @@ class flux_fitter:
            # WARNING: because there are no new ppfx fluxes we use old ones in both cases
            name = 'old'
 
+        self._OAviews = {}
         nUniv = self.nPpfxUniv
-        ND_CV = ND_ppfx_CV[name].load(binEdges = [self.EbinEdges, self.OAEdges])
-        ND_ppfx = np.array([shift.load(binEdges = [self.EbinEdges, self.OAEdges])
-                                        for shift in ND_ppfx_univ[name][:nUniv]])
-        ND_ppfx /= ND_CV
-        ND_ppfx *= self.ND_nom
+        nOA = len(self.__OAbins)
+        ND_ppfx = self._universe_tensor((nUniv, len(self.Ebins), nOA + 1 if self.useHC else nOA))
 
-        self.ND_ppfx_shifts = ND_ppfx
+        # ppfx hists have the binning of the nominal ND hist of their own file set
+        ppfx_binning = axes(name)
+        ppfx_rebinner = Rebinner.for_axes((ppfx_binning["Ebins"], ppfx_binning["OAbins"]),
+                                          (self.EbinEdges, self.__OAbinEdges))
+
+        ND_CV = ND_ppfx_CV[name].load(rebinner = ppfx_rebinner)
+        OA_ppfx = ND_ppfx[:, :, :nOA]
+        load_many(ND_ppfx_univ[name][:nUniv], out = OA_ppfx,
+                  rebinner = ppfx_rebinner)
+        OA_ppfx /= ND_CV
+        OA_ppfx *= self._ND_nom_full
 
         if self.useHC:
             HC_CV = HC_ppfx_CV[name].load(binEdges = [self.EbinEdges])
-            HC_ppfx = np.array([shift.load(binEdges = [self.EbinEdges])
-                                            for shift in HC_ppfx_univ[name][:nUniv]])
+            HC_ppfx = ND_ppfx[:, :, nOA]
+            load_many(HC_ppfx_univ[name][:nUniv], out = HC_ppfx,
+                      binEdges = [self.EbinEdges])
             HC_ppfx /= HC_CV
             HC_ppfx *= self.HC_nom
 
             self.HC_ppfx_shifts = HC_ppfx
 
-            ND_ppfx = np.array([np.append(self.ND_ppfx_shifts[i].T, [self.HC_ppfx_shifts[i]], axis=0).T for i in range(0, nUniv)])
-            self.ND_ppfx_shifts = ND_ppfx
+        self._ND_ppfx_full = ND_ppfx
+
+    def _universe_tensor(self, shape):
+        """
+        allocate an array for ppfx univs,
+        backed by the file self.ppfxMemmap (.npy) if it's set
+        """
+
+        if self.ppfxMemmap:
+            return np.lib.format.open_memmap(self.ppfxMemmap, mode = "w+",
+                                             dtype = float, shape = shape)
+        return np.empty(shape)
 
     def load_shifts(self, **kwargs):
         """
@@ -214,6 +269,7 @@ class flux_fitter:
 
         if self.ppfx_loaded:
             self.nPpfxUniv = kwargs['PpfxUniv']
+            self.ppfxMemmap = kwargs.get('PpfxMemmap', False)
             self.load_FD_ppfx_shifts()
             self.load_ND_ppfx_shifts()
        
@@ -230,8 +286,9 @@ class flux_fitter:
         self.FD_RHC_nom = FD_RHC_nom[self.f].load(binEdges = [self.EbinEdges])
 
         if self.other_loaded:
-            FD_RHC_other = {key: shift.load(binEdges = [self.EbinEdges])
-                              for key, shift in FD_RHC_other_shifts[self.f].items()}
+            shifts = FD_RHC_other_shifts[self.f]
+            FD_RHC_other = dict(zip(shifts.keys(),
+                                    load_many(list(shifts.values()), binEdges = [self.EbinEdges])))
             self.FD_RHC_other_shifts = FD_RHC_other
 
         if self.f == 'old':
@@ -243,8 +300,9 @@ class flux_fitter:
         if self.ppfx_loaded:
             nUniv = self.nPpfxUniv
             FD_RHC_CV = FD_RHC_ppfx_CV[name].load(binEdges = [self.EbinEdges])
-            FD_RHC_ppfx = np.array([shift.load(binEdges = [self.EbinEdges])
-                                            for shift in FD_RHC_ppfx_univ[name][:nUniv]])
+            FD_RHC_ppfx = np.empty((nUniv, len(self.Ebins)))
+            load_many(FD_RHC_ppfx_univ[name][:nUniv], out = FD_RHC_ppfx,
+                      binEdges = [self.EbinEdges])
             FD_RHC_ppfx /= FD_RHC_CV
             FD_RHC_ppfx *= self.FD_RHC_nom
 
@@ -278,8 +336,8 @@ class flux_fitter:
     def cut_OArange(self, OA_range):
         """
         Specify OA range smaller than full OA range. 
-        self.__OAbinEdges_new and __self.OAbinEdges are different 
-        in order to call cut_OArange many times in one class object.
+        ND fluxes are not reloaded: they are cut from the full OA range (see _OA_cut()),
+        so cut_OArange can be called many times in one class object.
 
         Args:
             OA_range(list): might be tuple
@@ -289,25 +347,58 @@ class flux_fitter:
         self.minOA = OA_range[0]
         self.maxOA = OA_range[-1]
 
-        OA_condition_left = self.__OAbins >= self.minOA
-        OA_condition_right = self.__OAbins <= self.maxOA
-        self.__OAbins_new = self.__OAbins[OA_condition_left & OA_condition_right]
-
-        extended_mask_left = np.pad(OA_condition_left, (0,1), 'edge')
-        extended_mask_right = np.pad(OA_condition_right, (1,0), 'edge')
-        self.__OAbinEdges_new = self.__OAbinEdges[extended_mask_left & extended_mask_right]
+        self._OAslice = OA_slice(self.__OAbins, OA_range)
+        self._OAviews = {}
+        self._propagated = {}
 
         self.cut_OArange_flag = True
-        self.OABins = self.__OAbins_new
-        self.OAEdges = self.__OAbinEdges_new
-        self.load_ND_nom()
+        self.OABins = self.__OAbins[self._OAslice]
+        self.OAEdges = self.__OAbinEdges[self._OAslice.start:self._OAslice.stop + 1]
 
-        if self.ppfx_loaded:
-            self.load_ND_ppfx_shifts()
+    def _OA_cut(self, full, HC = False):
+        """ ND flux of the full OA range in the current OA range (see OA_cut()) """
+        return OA_cut(full, self._OAslice, HC)
 
-        if self.other_loaded:
-            self.load_ND_other_shifts()
+    def _OA_view(self, name, make):
+        """ cut ND flux made once per OA range (see _OAviews) """
+        if name not in self._OAviews:
+            self._OAviews[name] = make()
+        return self._OAviews[name]
+
+    @property
+    def ND_nom(self):
+        return self._OA_cut(self._ND_nom_full)
 
+    @property
+    def ND_HC_nom(self):
+        return self._OA_view("ND_HC_nom", 
+                             lambda: self._OA_cut(self._ND_HC_nom_full, HC = True))
+
+    @property
+    def ND_ppfx_shifts(self):
+        return self._OA_view("ND_ppfx_shifts", 
+                             lambda: self._OA_cut(self._ND_ppfx_full, HC = self.useHC))
+
+    @property
+    def ND_other_shifts(self):
+        return self._OA_view("ND_other_shifts", 
+                             lambda: {key: self._OA_cut(shift, HC = self.useHC)
+                                      for key, shift in self._ND_other_full.items()})
+
+
+    def _fit_matrices(self, useHC):
+        """
+        Return ND matrix, penalty matrix A and weighting matrix P of the fit
+        """
+
+        if useHC:
+            ND = self.ND_HC_nom
+        else:
+            ND = self.ND_nom
+
+        A = penalty_matrix(len(self.OABins), useHC)
+        P = weight_matrix(self.Ebins, self.Ebounds, self.OutOfRegionFactors)
+        return ND, A, P
 
     def calc_coeffs(self, reg, FD_init, useHC=True):
         """
@@ -318,28 +409,15 @@ class flux_fitter:
         if useHC:
             useHC = self.useHC
 
-        if useHC:
-            ND = self.ND_HC_nom
-        else:
-            ND = self.ND_nom
+        ND, A, P = self._fit_matrices(useHC)
         target = FD_init * self.Posc        
 
         # penalty matrix A
-        nBinsOA = len(self.OABins)
-        OA_penalty = np.diag((nBinsOA-1)*[1] + [0]) - np.diag((nBinsOA - 1)*[1], k = 1)
-        if useHC:
-            HC_penalty = np.diag([0])
-            A = block_diag(OA_penalty, HC_penalty)
-        else:
-            A = block_diag(OA_penalty)
-
         self.A = A
         Gamma = reg * self.A
         self.Gamma = Gamma
 
         # weighting matrix for target flux
-        P = np.diag(np.where(self.Ebins > self.Ebounds[1], self.OutOfRegionFactors[1],
-                    np.where(self.Ebins < self.Ebounds[0], self.OutOfRegionFactors[0], 1)))
         self.P = P
 
         # ND matrix
@@ -358,3 +436,419 @@ class flux_fitter:
        
         self.target = target
         return self.target, self.fluxPred, self.c
+
+    def calc_coeffs_batch(self, regs, FD_inits, useHC=True):
+        """
+        Calculate coefficients for many reg parameters and many targets at once.
+        The fit matrices are factorized once (see RegularizedSolver),
+        so a scan over 1000 reg parameters costs about one calc_coeffs().
+
+        Args:
+            regs (list): nReg reg parameters
+            FD_inits (array): (nTarget, nE) or (nE,) unoscillated FD fluxes
+        Returns:
+            target (nTarget, nE), fluxPred (nReg, nTarget, nE), c (nReg, nTarget, nC)
+        """
+
+        if useHC:
+            useHC = self.useHC
+
+        ND, A, P = self._fit_matrices(useHC)
+        target = np.atleast_2d(FD_inits) * self.Posc
+
+        c = RegularizedSolver(ND, P, A).coeffs(regs, target)
+        fluxPred = np.einsum('ei,lti->lte', ND, c)
+        return target, fluxPred, c
+
+    def propagate_shifts(self, c, type_shifts, type_target='FHC'):
+        """
+        Propagate all shifted fluxes through coeffs at once:
+        ND predictions ND_shift * c of all shifts by one matrix product
+        and oscillated FD shifts FD_shift * Posc. 
+        The result of the last coeffs is cached for each type of shifts and target.
+
+        Args:
+            c (array): coeffs from calc_coeffs()
+            type_shifts (str): other/ppfx
+            type_target (str): FHC/RHC
+        Returns:
+            shifts (list): names (other) or numbers (ppfx) of shifts
+            ND_pred (array): (nShift, nE) ND predictions
+            FD_osc (array): (nShift, nE) oscillated FD fluxes
+        """
+
+        if type_shifts == 'other':
+            ND_shifts = self.ND_other_shifts
+            FD_shifts = self.FD_other_shifts if type_target == 'FHC' else self.FD_RHC_other_shifts
+        elif type_shifts == 'ppfx':
+            ND_shifts = self.ND_ppfx_shifts
+            FD_shifts = self.FD_ppfx_shifts if type_target == 'FHC' else self.FD_RHC_ppfx_shifts
+        else:
+            raise Exception(f"Type of uncertainties is other/ppfx, not {type_shifts}")
+
+        c = np.asarray(c, dtype=float)
+        key = (type_shifts, type_target)
+        cached = self._propagated.get(key)
+        if (cached and cached[0] == c.tobytes() 
+                and cached[1] is ND_shifts and cached[2] is FD_shifts):
+            return cached[3]
+
+        if type_shifts == 'other':
+            shifts = list(FD_shifts.keys())
+            ND_stack = np.stack([ND_shifts[shift] for shift in shifts])
+            FD_stack = np.stack([FD_shifts[shift] for shift in shifts])
+        else:
+            shifts = list(range(len(ND_shifts)))
+            ND_stack, FD_stack = ND_shifts, FD_shifts
+
+        ND_pred = np.einsum('sei,i->se', ND_stack, c)
+        FD_osc = FD_stack * self.Posc
+
+        result = (shifts, ND_pred, FD_osc)
+        # only the last coeffs are kept: {(type_shifts, type_target): (c, ..., result)}
+        self._propagated[key] = (c.tobytes(), ND_shifts, FD_shifts, result)
+        return result
+
+    def _FD_init(self, target):
+        """ unoscillated FD flux for FHC/RHC (or the flux itself) """
+        if isinstance(target, str) and target == 'FHC':
+            return self.FD_nom
+        elif isinstance(target, str) and target == 'RHC':
+            if self.FD_RHC_nom is None:
+                self.add_new_FD()
+            return self.FD_RHC_nom
+        elif isinstance(target, str):
+            raise Exception(f'Type of target is FHC/RHC, not {target}')
+        return target
+
+    def scan_regularization(self, regs, targets=('FHC', 'RHC'), useHC=True):
+        """
+        L-curve scan of the reg parameter: for each target calculate 
+        the residual norm |P^1/2 (ND c - target)| and the penalty norm |A c| 
+        on the grid of regs (one factorization, see calc_coeffs_batch()), 
+        the curvature of the L-curve in log-log scale and 
+        the optimal reg at the point of maximum curvature
+
+        Args:
+            regs (list): grid of reg parameters (log-spaced is the best)
+            targets (tuple): FHC/RHC or unoscillated FD fluxes
+        Returns:
+            (dict): reg (nReg), residual, penalty, curvature (nTarget, nReg),
+                    reg_opt (nTarget)
+        """
+
+        if useHC:
+            useHC = self.useHC
+
+        FD_inits = [self._FD_init(target) for target in targets]
+
+        regs = np.sort(np.asarray(regs, dtype=float))
+        assert regs.size > 4 and regs[0] > 0, "regs must be > 0, at least 5 values"
+
+        target, fluxPred, c = self.calc_coeffs_batch(regs, np.array(FD_inits), useHC)
+        ND, A, P = self._fit_matrices(useHC)
+        w = np.sqrt(np.diag(P))
+
+        residual = np.linalg.norm((fluxPred - target) * w, axis=-1).T
+        penalty = np.linalg.norm(np.einsum('ij,ltj->lti', A, c), axis=-1).T
+
+        # curvature of (log residual, log penalty) as a function of log reg
+        t = np.log(regs)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x, y = np.log(residual), np.log(penalty)
+            dx, dy = np.gradient(x, t, axis=-1), np.gradient(y, t, axis=-1)
+            ddx, ddy = np.gradient(dx, t, axis=-1), np.gradient(dy, t, axis=-1)
+            curvature = (dx*ddy - ddx*dy) / (dx**2 + dy**2)**1.5
+
+        # for large regs the penalty reaches the rounding level and the curve is noise
+        rounding = penalty <= 1e-12 * penalty.max(axis=-1, keepdims=True)
+        curvature[rounding | ~np.isfinite(curvature)] = np.nan
+
+        # edges of the grid are not reliable for derivatives
+        reg_opt = regs[1 + np.nanargmax(curvature[:, 1:-1], axis=-1)]
+
+        return dict(reg=regs, residual=residual, penalty=penalty, 
+                    curvature=curvature, reg_opt=reg_opt)
+
+    def scan(self, oa_ranges, fit_regions, oor_weights, regs, 
+             targets=('FHC',), useHC=True, jobs=None):
+        """
+        Quality of the fit for all combinations of OA ranges, fit regions, 
+        OOR weights and reg parameters. Each (OA range, fit region, OOR weights) 
+        is factorized once for all regs and targets (see RegularizedSolver). 
+        They are calculated in parallel processes, which read the full OA range 
+        ND fluxes from shared memory. The fitter itself is not changed.
+
+        Args:
+            oa_ranges (list): OA ranges, see cut_OArange()
+            fit_regions (list): energy bounds, see set_fit_region()
+            oor_weights (list): weights outside the fit region, see set_OOR()
+            regs (list): reg parameters
+            targets (tuple): FHC/RHC or unoscillated FD fluxes (without shifts)
+            jobs (int): number of processes (the number of cores by default), 
+                        1 -- in this process
+        Returns:
+            (list): results table, a dict for each 
+                    (target, OA range, fit region, OOR weights, reg):
+                    target, OA_range, fit_region, OOR, reg,
+                    residual_in/residual_out: rms of (LC - FD_osc)/FD_unosc 
+                                              inside/outside the fit region,
+                    smoothness: |A c|,
+                    spread: {shift: rms of (ND_shift c - LC - FD_osc_shift + FD_osc)/FD_unosc
+                             inside the fit region}, all univs together for 'ppfx'
+        """
+
+        if useHC:
+            useHC = self.useHC
+
+        names = [target if isinstance(target, str) else "target_" + str(i) 
+                 for i, target in enumerate(targets)]
+        FD_inits = np.array([self._FD_init(target) for target in targets], dtype=float)
+
+        arrays = dict(ND=self._ND_HC_nom_full if useHC else self._ND_nom_full, 
+                      FD=FD_inits, 
+                      Posc=np.broadcast_to(np.asarray(self.Posc, dtype=float), 
+                                           self.Ebins.shape).copy())
+        shift_names = {}
+        FD_shifts = dict(other=dict(FHC='FD_other_shifts', RHC='FD_RHC_other_shifts'),
+                         ppfx=dict(FHC='FD_ppfx_shifts', RHC='FD_RHC_ppfx_shifts'))
+        if self.other_loaded:
+            shift_names['other'] = list(self.FD_other_shifts.keys())
+            arrays['ND_other'] = np.stack([self._ND_other_full[shift] 
+                                           for shift in shift_names['other']])
+        if self.ppfx_loaded:
+            shift_names['ppfx'] = ['ppfx']
+            arrays['ND_ppfx'] = self._ND_ppfx_full
+        for group in shift_names:
+            for t, name in enumerate(names):
+                if name in FD_shifts[group]:
+                    shifts = getattr(self, FD_shifts[group][name])
+                    if group == 'other':
+                        shifts = np.stack([shifts[shift] for shift in shift_names[group]])
+                    arrays['FD_' + group + '_' + str(t)] = shifts
+
+        params = dict(Ebins=np.asarray(self.Ebins, dtype=float), 
+                      regs=np.atleast_1d(np.asarray(regs, dtype=float)),
+                      useHC=useHC, names=names, shift_names=shift_names)
+        configs = [(OA_range, OA_slice(self.__OAbins, OA_range), 
+                    tuple(fit_region), tuple(weights))
+                   for OA_range in oa_ranges
+                   for fit_region in fit_regions
+                   for weights in oor_weights]
+
+        jobs = jobs or os.cpu_count()
+        if jobs == 1:
+            _scan_data.update(arrays, **params)
+            try:
+                results = [_scan_config(config) for config in configs]
+            finally:
+                _scan_data.clear()
+        else:
+            blocks, specs = _share_arrays(arrays)
+            try:
+                with ProcessPoolExecutor(max_workers=jobs, mp_context=mp.get_context("spawn"),
+                                         initializer=_scan_init, 
+                                         initargs=(specs, params)) as pool:
+                    results = list(pool.map(_scan_config, configs, 
+                                            chunksize=max(1, len(configs)//(4*jobs))))
+            finally:
+                for block in blocks:
+                    block.close()
+                    block.unlink()
+        return [row for rows in results for row in rows]
+
+
+def penalty_matrix(nBinsOA, useHC):
+    """
+    penalty matrix A: differences of neighbouring OA coeffs, HC coeff is not penalized
+    """
+
+    OA_penalty = np.diag((nBinsOA-1)*[1] + [0]) - np.diag((nBinsOA - 1)*[1], k = 1)
+    if useHC:
+        HC_penalty = np.diag([0])
+        return block_diag(OA_penalty, HC_penalty)
+    return block_diag(OA_penalty)
+
+def weight_matrix(Ebins, Ebounds, OutOfRegionFactors):
+    """
+    weighting matrix P for target flux: 1 in the fit region, 
+    OutOfRegionFactors below/above it
+    """
+
+    return np.diag(np.where(Ebins > Ebounds[1], OutOfRegionFactors[1],
+                   np.where(Ebins < Ebounds[0], OutOfRegionFactors[0], 1)))
+
+
+def OA_slice(OAbins, OA_range):
+    """
+    slice of OA bins with centers inside OA_range (see flux_fitter.cut_OArange())
+    """
+
+    inside = np.flatnonzero((OAbins >= OA_range[0]) & (OAbins <= OA_range[-1]))
+    assert inside.size, f"no OA bins in {OA_range}"
+    return slice(inside[0], inside[-1] + 1)
+
+def OA_cut(full, OAslice, HC = False):
+    """
+    ND flux (..., nOA(+1)) of the full OA range in the OA range of OAslice. 
+    It is a view without copy, except for the HC column after the OA range 
+    that isn't the last one: then OA bins and HC are copied in a new array. 
+
+    Args:
+        full (array): ND flux in the full OA range
+        OAslice (slice): see OA_slice()
+        HC (bool): the last column is HC
+    """
+
+    start, stop = OAslice.start, OAslice.stop
+    if not HC:
+        return full[..., start:stop]
+    if stop == full.shape[-1] - 1:
+        return full[..., start:]
+    return np.concatenate((full[..., start:stop], full[..., -1:]), axis = -1)
+
+
+class RegularizedSolver:
+    """
+    Solve  min |P^1/2 (ND c - target)|^2 + reg^2 |A c|^2  for many regs and targets.
+
+    The problem is brought to the standard Tikhonov form (A-weighted pseudo-inverse
+    of A, the null space of A is fitted without penalty) and the transformed ND
+    matrix is decomposed by one SVD. Then coeffs for any reg are filter factors
+    s/(s^2 + reg^2) applied to the SVD, i.e. no matrix is inverted per reg.
+    It is also much better conditioned than the normal equations ND^T P ND.
+
+    Methods:
+        -- __init__(): factorize ND, P, A
+        -- coeffs(): coeffs for arrays of regs and targets
+    """
+    def __init__(self, ND, P, A):
+        self.ND = np.asarray(ND)
+        self.w = np.sqrt(np.diag(P))
+        K = self.ND * self.w[:, None]
+
+        Z = null_space(A)
+        A_pinv = np.linalg.pinv(A)
+        self.KZ_pinv = Z @ np.linalg.pinv(K @ Z)
+        # A-weighted pseudo-inverse of A
+        self.A_pinv = A_pinv - self.KZ_pinv @ (K @ A_pinv)
+        self.K = K
+
+        self.U, self.s, self.Vt = np.linalg.svd(K @ self.A_pinv, full_matrices=False)
+
+    def coeffs(self, regs, targets):
+        """
+        Args:
+            regs (list): nReg reg parameters
+            targets (array): (nTarget, nE) or (nE,) oscillated targets
+        Returns:
+            c (array): (nReg, nTarget, nC)
+        """
+
+        regs = np.atleast_1d(np.asarray(regs, dtype=float))
+        targets = np.atleast_2d(targets)
+        tw = (targets * self.w).T
+
+        # unpenalized part from the null space of A
+        c0 = self.KZ_pinv @ tw
+        beta = self.U.T @ (tw - self.K @ c0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # reg = 0 is replaced below
+            filters = self.s / (self.s**2 + regs[:, None]**2)
+        y = np.einsum('jp,lj,jt->ltp', self.Vt, filters, beta)
+        c = np.einsum('ip,ltp->lti', self.A_pinv, y) + c0.T
+
+        # reg = 0: calc_coeffs() takes the plain least squares solution
+        noReg = regs == 0
+        if noReg.any():
+            c[noReg] = targets @ np.linalg.pinv(self.ND.T)
+        return c
+
+
+# arrays and parameters of flux_fitter.scan() in this process
+_scan_data = {}
+# shared memory blocks attached by this process
+_scan_blocks = []
+
+def _share_arrays(arrays):
+    """
+    copy arrays in shared memory
+
+    Returns:
+        blocks (list): SharedMemory blocks (to close and unlink)
+        specs (dict): {name: (block name, shape, dtype)}
+    """
+
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+def _scan_init(specs, params):
+    """ attach shared arrays in a process of flux_fitter.scan() """
+
+    for name, (block_name, shape, dtype) in specs.items():
+        # spawned processes share the resource tracker of the main process,
+        # which unlinks the blocks
+        block = shared_memory.SharedMemory(name=block_name)
+        _scan_blocks.append(block)
+        _scan_data[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    _scan_data.update(params)
+
+def _scan_config(config):
+    """
+    rows of flux_fitter.scan() for one (OA range, fit region, OOR weights)
+    """
+
+    OA_range, OAslice, fit_region, weights = config
+    d = _scan_data
+    Ebins, regs, useHC = d['Ebins'], d['regs'], d['useHC']
+
+    ND = OA_cut(d['ND'], OAslice, useHC)
+    A = penalty_matrix(OAslice.stop - OAslice.start, useHC)
+    P = weight_matrix(Ebins, fit_region, weights)
+    FD = d['FD']
+    target = FD * d['Posc']
+
+    c = RegularizedSolver(ND, P, A).coeffs(regs, target)
+    fluxPred = np.einsum('ei,lti->lte', ND, c)
+    smoothness = np.linalg.norm(np.einsum('ij,ltj->lti', A, c), axis=-1)
+
+    # the same region as in weight_matrix()
+    inside = (Ebins >= fit_region[0]) & (Ebins <= fit_region[1])
+    rms = lambda x: np.sqrt(np.mean(x**2, axis=-1)) if x.shape[-1] else np.full(x.shape[:-1], np.nan)
+    ratio = (fluxPred - target) / FD
+    residual_in = rms(ratio[..., inside])
+    residual_out = rms(ratio[..., ~inside])
+
+    spread = np.empty(c.shape[:2], dtype=object)
+    for l in range(len(regs)):
+        for t in range(len(FD)):
+            spread[l, t] = {}
+    for group, shift_names in d['shift_names'].items():
+        ND_shifts = OA_cut(d['ND_' + group], OAslice, useHC)
+        for t in range(len(FD)):
+            if 'FD_' + group + '_' + str(t) not in d:
+                continue
+            FD_osc = d['FD_' + group + '_' + str(t)] * d['Posc']
+            ND_pred = np.einsum('sei,li->lse', ND_shifts, c[:, t])
+            z = ((ND_pred - fluxPred[:, t, None]) - (FD_osc - target[t])) / FD[t]
+            # (nReg, nShift) or (nReg,) for all univs
+            if group == 'ppfx':
+                z_rms = rms(z[..., inside].reshape(len(regs), -1))[:, None]
+            else:
+                z_rms = rms(z[..., inside])
+            for l in range(len(regs)):
+                spread[l, t].update(zip(shift_names, z_rms[l]))
+
+    return [dict(target=name, OA_range=tuple(OA_range), fit_region=fit_region, 
+                 OOR=weights, reg=float(reg), 
+                 residual_in=float(residual_in[l, t]), residual_out=float(residual_out[l, t]),
+                 smoothness=float(smoothness[l, t]), 
+                 spread={shift: float(value) for shift, value in spread[l, t].items()})
+            for t, name in enumerate(d['names'])
+            for l, reg in enumerate(regs)]
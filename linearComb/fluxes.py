@@ -1,5 +1,129 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+import atexit
+import hashlib
+import os
 from utils import *
-from ROOT import TFile
+
+
+def _open_root(infileName):
+    """ import ROOT only when a root-file is really opened """
+    from ROOT import TFile
+    return TFile(infileName)
+
+
+class FilePool:
+    """ keep input root-files open between loads
+
+    Methods:
+        -- get(): return an open file, open it if necessary
+                  (the least recently used file is closed if there are too many)
+        -- close(): close one file
+        -- close_all(): close all files
+    """
+    def __init__(self, max_open = 16):
+        self.max_open = max_open
+        self.files = OrderedDict()
+
+    def get(self, infileName):
+        if infileName in self.files:
+            self.files.move_to_end(infileName)
+            return self.files[infileName]
+
+        infile = _open_root(infileName)
+        assert infile and not infile.IsZombie(), f"{infileName} can't be opened"
+        self.files[infileName] = infile
+        while len(self.files) > self.max_open:
+            _, oldest = self.files.popitem(last=False)
+            oldest.Close()
+        return infile
+
+    def close(self, infileName):
+        infile = self.files.pop(infileName, None)
+        if infile is not None:
+            infile.Close()
+
+    def close_all(self):
+        while self.files:
+            _, infile = self.files.popitem(last=False)
+            infile.Close()
+
+
+# shared by all 'flux' objects
+file_pool = FilePool()
+atexit.register(file_pool.close_all)
+
+
+def cache_path(infileName, branchName, binEdges = [], method = "average", **kwargs):
+    """
+    name of the .npy file where a loaded hist is cached.
+    It depends on the source file (path, mtime, size), the hist name
+    and the requested binning, so the cache is rebuilt if any of them changes.
+
+    Returns:
+        path (str) or None if the cache is off
+    """
+    if not use_cache or kwargs:
+        return None
+
+    stat = os.stat(infileName)
+    key = hashlib.sha1(repr((os.path.abspath(infileName), branchName,
+                             stat.st_mtime_ns, stat.st_size, method)).encode())
+    for edges in binEdges:
+        key.update(np.ascontiguousarray(edges, dtype = float).tobytes())
+        key.update(b"|")
+    return os.path.join(cache_dir, key.hexdigest() + ".npy")
+
+def _load_cached(path):
+    """ memory-mapped cached array or None """
+    if path is None or not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode = "r")
+
+def _store_cached(path, content):
+    """ save an array in the cache (atomically) and return the cached version """
+    if path is None:
+        return content
+    os.makedirs(cache_dir, exist_ok = True)
+    tmp_path = path + "." + str(os.getpid()) + ".tmp"
+    with open(tmp_path, "wb") as tmp:
+        np.save(tmp, np.asarray(content))
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode = "r")
+
+
+# open columnar files: {path: (mtime, NpzFile)}
+_columnar_files = {}
+
+def columnar_store(infileName):
+    """
+    .npz file written by FormFile(columnar = True) next to the root-file.
+    Hists are read from it member by member, the whole file is not loaded.
+
+    Returns:
+        NpzFile or None if there is no file, it is older than the root-file
+        or the columnar files are off
+    """
+    npzName = os.path.splitext(infileName)[0] + ".npz"
+    if not use_columnar or not os.path.exists(npzName):
+        return None
+    mtime = os.stat(npzName).st_mtime_ns
+    if os.path.exists(infileName) and mtime < os.stat(infileName).st_mtime_ns:
+        return None
+
+    if npzName not in _columnar_files or _columnar_files[npzName][0] != mtime:
+        if npzName in _columnar_files:
+            _columnar_files[npzName][1].close()
+        _columnar_files[npzName] = (mtime, np.load(npzName))
+    return _columnar_files[npzName][1]
+
+def _close_columnar():
+    while _columnar_files:
+        _, (_, store) = _columnar_files.popitem()
+        store.close()
+
+atexit.register(_close_columnar)
+
 
 class flux:
     """ define fluxes for using in flux_fitter
@@ -15,6 +139,9 @@ class flux:
                                   keys are names of different data,
                                   list is made of numbered fluxes
         -- load(): is used in class 'flux_fitter' to load fluxes
+                   (from the columnar file if it exists, see columnar_store(), 
+                    or from the .npy cache if the hist was loaded before, see cache_path())
+        -- load_many(): load a list of fluxes with one open per file
     """
     def __init__(self, infileName, branchName):
         self.infileName = infileName
@@ -49,19 +176,88 @@ class flux:
                 for key in NewOld}
 
 
-    def load(self, **kwargs):
+    def load(self, rebinner = None, **kwargs):
         """
         load a hist 
 
+        Args:
+            rebinner (Rebinner): rebin the hist loaded with its own binning
+                                 (instead of binEdges)
         Returns:
             content (array): 1D or 2D array from the hist
         """
-        infile = TFile(self.infileName)
+        if rebinner is not None:
+            return rebinner.apply(self.load(**kwargs))
+
+        store = columnar_store(self.infileName)
+        if store is not None and self.in_columnar(store):
+            return self._read_columnar(store, **kwargs)
+
+        path = cache_path(self.infileName, self.branchName, **kwargs)
+        content = _load_cached(path)
+        if content is None:
+            infile = file_pool.get(self.infileName)
+            content = _store_cached(path, self._read(infile, **kwargs))
+        return content
+
+    def _read(self, infile, **kwargs):
         TH = infile.Get(self.branchName)
         assert TH != None, f"{self.branchName} doesn't exist in {self.infileName}"
-        content = root_to_array(TH, **kwargs)
-        infile.Close()
-        return content
+        return root_to_array(TH, **kwargs)
+
+    def in_columnar(self, store):
+        return self.branchName + "/contents" in store.files
+
+    def _read_columnar(self, store, binEdges = [], method = "average", errors = False):
+        """ the same as _read() for columnar file """
+        key = self.branchName + "/"
+        con = store[key + "contents"]
+        oldBins = [0.5*(edges[:-1] + edges[1:]) 
+                   for edges in (store[key + "xedges"], store[key + "yedges"])]
+        con = resample(con, oldBins, binEdges, method)
+        if errors:
+            return con, resample_errors(store[key + "errors"], oldBins, binEdges, method)
+        return con
+
+
+def load_many(fluxes, out = None, rebinner = None, **kwargs):
+    """
+    load hists of many 'flux' objects: requests are grouped by file,
+    so each file is opened once and all its hists are read in one pass
+
+    Args:
+        fluxes (list): 'flux' class objects
+        out (array): if given, the i-th flux is written in out[i]
+                     and nothing else is kept in memory
+        rebinner (Rebinner): the same as for flux.load()
+        **kwargs: the same as for flux.load()
+    Returns:
+        contents (list or out): arrays in the order of fluxes
+    """
+    contents = [None]*len(fluxes) if out is None else out
+    # every hist is rebinned right after it is read, 
+    # so only one hist with its own binning is kept in memory
+    finish = (lambda content: content) if rebinner is None else rebinner.apply
+
+    groups = OrderedDict()
+    for i, fl in enumerate(fluxes):
+        store = columnar_store(fl.infileName)
+        if store is not None and fl.in_columnar(store):
+            contents[i] = finish(fl._read_columnar(store, **kwargs))
+            continue
+
+        path = cache_path(fl.infileName, fl.branchName, **kwargs)
+        content = _load_cached(path)
+        if content is None:
+            groups.setdefault(fl.infileName, []).append((i, path))
+        else:
+            contents[i] = finish(content)
+
+    for infileName, missing in groups.items():
+        infile = file_pool.get(infileName)
+        for i, path in missing:
+            contents[i] = finish(_store_cached(path, fluxes[i]._read(infile, **kwargs)))
+    return contents
 
 
 input_path = "../outputs/"
@@ -74,6 +270,12 @@ NewOld = ["300_285", "old"]
 file_name = input_path + mode + rest_name
 file_name_RHC = input_path + mode_RHC + rest_name
 
+# hists are read from .npz files next to root-files if they exist
+use_columnar = True
+# loaded hists are cached here as .npy files
+use_cache = True
+cache_dir = os.environ.get("FLUX_CACHE_DIR", os.path.join(input_path, ".flux_cache"))
+
 ppfx_N = 100
 systematics = {"300_285" : ("HornCurrent_pos", 
                          "DecayPipeRadius_pos", 
@@ -113,19 +315,74 @@ FD_RHC_ppfx_CV = flux(file_name_RHC, "FD/FD_ppfx_CV").define_dict(NewOld)
 FD_RHC_ppfx_univ = flux(file_name_RHC, "FD/FD_ppfx_").define_list_in_dict(NewOld, ppfx_N)
 
 
-nomFile, nomTH, Ebins, OAbins = {}, {}, {}, {}
-EbinLowEdges, OAbinLowEdges, EbinUpEdges, OAbinUpEdges = {}, {}, {}, {}
-EbinEdges, OAbinEdges = {}, {}
-for key in NewOld:
-    nomFile[key]= TFile(file_name + key + ".root")
-    nomTH[key] = nomFile[key].Get("ND/ND_NominalFlux")
-    Ebins[key] = root_to_axes(nomTH[key])[0]
-    OAbins[key] = root_to_axes(nomTH[key])[1]
+_axes = {}
+
+def axes(file_set):
+    """
+    Energy and OA binning of the nominal ND hist of a data file,
+    computed on first request and memoized per file set
+
+    Args:
+        file_set (str): name of data file, see NewOld
+    Returns:
+        (dict): Ebins, OAbins (central values),
+                EbinLowEdges, OAbinLowEdges, EbinUpEdges, OAbinUpEdges,
+                EbinEdges, OAbinEdges
+    """
+    if file_set not in _axes:
+        nomFileName = file_name + file_set + ".root"
+        edges = []
+
+        def read_edges(axis):
+            if not edges:
+                nomFile = _open_root(nomFileName)
+                nomTH = nomFile.Get("ND/ND_NominalFlux")
+                assert nomTH != None, f"ND/ND_NominalFlux doesn't exist in {nomFileName}"
+                edges.extend(root_to_edges(nomTH))
+                nomFile.Close()
+            return edges[axis]
+
+        store = columnar_store(nomFileName)
+        if store is not None and "ND/ND_NominalFlux/xedges" in store.files:
+            edges.extend((store["ND/ND_NominalFlux/xedges"], 
+                          store["ND/ND_NominalFlux/yedges"]))
+
+        bin_edges = []
+        for axis, name in enumerate(("Eedges", "OAedges")):
+            path = None if edges else cache_path(nomFileName, "ND/ND_NominalFlux:" + name)
+            axis_edges = _load_cached(path)
+            if axis_edges is None:
+                axis_edges = _store_cached(path, read_edges(axis))
+            bin_edges.append(np.array(axis_edges))
+        EbinEdges, OAbinEdges = bin_edges
+
+        _axes[file_set] = dict(Ebins = 0.5*(EbinEdges[:-1] + EbinEdges[1:]),
+                               OAbins = 0.5*(OAbinEdges[:-1] + OAbinEdges[1:]),
+                               EbinLowEdges = EbinEdges[:-1],
+                               OAbinLowEdges = OAbinEdges[:-1],
+                               EbinUpEdges = EbinEdges[1:],
+                               OAbinUpEdges = OAbinEdges[1:],
+                               EbinEdges = EbinEdges,
+                               OAbinEdges = OAbinEdges)
+    return _axes[file_set]
+
+
+class _AxisTable(Mapping):
+    """ dict-like view {file_set: axes(file_set)[name]}, filled lazily """
+    def __init__(self, name):
+        self.name = name
+
+    def __getitem__(self, file_set):
+        return axes(file_set)[self.name]
+
+    def __iter__(self):
+        return iter(NewOld)
+
+    def __len__(self):
+        return len(NewOld)
 
-    EbinLowEdges[key] = root_to_axes(nomTH[key], where='pre')[0]
-    OAbinLowEdges[key] = root_to_axes(nomTH[key], where='pre')[1]
-    EbinUpEdges[key] = root_to_axes(nomTH[key], where='post')[0]
-    OAbinUpEdges[key] = root_to_axes(nomTH[key], where='post')[1]
 
-    EbinEdges[key] = np.concatenate([EbinLowEdges[key], EbinUpEdges[key][-1:]])
-    OAbinEdges[key] = np.concatenate([OAbinLowEdges[key], OAbinUpEdges[key][-1:]])
+Ebins, OAbins = _AxisTable("Ebins"), _AxisTable("OAbins")
+EbinLowEdges, OAbinLowEdges = _AxisTable("EbinLowEdges"), _AxisTable("OAbinLowEdges")
+EbinUpEdges, OAbinUpEdges = _AxisTable("EbinUpEdges"), _AxisTable("OAbinUpEdges")
+EbinEdges, OAbinEdges = _AxisTable("EbinEdges"), _AxisTable("OAbinEdges")
@@ -2,15 +2,21 @@ from utils import *
 import sys
 import os
 
-# Make sure that Prob3 is installed
-if 'PROB3ROOT' in os.environ:
-    Prob3Root = os.environ['PROB3ROOT']
-else:
-    Prob3Root = os.path.join(os.getcwd(), "../Prob3")
-    os.environ['PROB3ROOT'] = Prob3Root
+def BargerPropagator():
+    """
+    Prob3 propagator; Prob3 is imported only if this engine is used
+    """
+    # Make sure that Prob3 is installed
+    if 'PROB3ROOT' in os.environ:
+        Prob3Root = os.environ['PROB3ROOT']
+    else:
+        Prob3Root = os.path.join(os.getcwd(), "../Prob3")
+        os.environ['PROB3ROOT'] = Prob3Root
 
-sys.path.append(os.path.dirname(Prob3Root))    
-from Prob3 import BargerPropagator
+    if os.path.dirname(Prob3Root) not in sys.path:
+        sys.path.append(os.path.dirname(Prob3Root))    
+    from Prob3 import BargerPropagator
+    return BargerPropagator()
 
 prob3Codes = {"nue": 1,
               "numu": 2,
@@ -19,10 +25,97 @@ prob3Codes = {"nue": 1,
               "numubar": -2,
               "nutaubar": -3}
 
+# names of oscillation parameters in the order of BargerPropagator.SetMNS()
+oscParams = ("s12", "s13", "s23", "dm21", "dm32", "dcp")
+
+# the same constants as in Prob3 (mosc.c, EarthDensity.cc, BargerPropagator.cc)
+LoEfac = 2.534             # 1/(2 hbar c): phase = LoEfac * dm^2 [eV^2] * L [km] / E [GeV]
+tworttwoGf = 1.52588e-4    # 2 sqrt(2) G_F N_A: A [eV^2] = tworttwoGf * E [GeV] * rho Ye [g/cm^3]
+REarth = 6371.0            # km
+crustDensity = 3.3         # g/cm^3, outer layer of the Prob3 Earth model
+electronFraction = 0.5     # Ye, density_convert in Prob3
+
+# probabilities calculated in this process: 
+# {(engine, fromFlavor, toFlavor, s12, s13, s23, dm21, dm32, dcp, Ebins): P}
+_probCache = {}
+
+
+def three_flavor_prob(fromFlavor, toFlavor, s12, s13, s23, dm21, dm32, dcp,
+                      Ebins, L, rho):
+    """
+    Three-flavor probabilities for a constant matter density, vectorized
+    over the oscillation parameters and energies. 
+    Conventions follow BargerPropagator.SetMNS(kSquared = True): 
+    sXY = sin^2(thetaXY); dm32 is m3^2 - m2^2 for dm32 > 0 (NH) 
+    and m3^2 - m1^2 for dm32 < 0 (IH).
+
+    Args:
+        fromFlavor, toFlavor (int): see prob3Codes
+        s12, ..., dcp (array): nParam values of each parameter
+        Ebins (array): nE energies, GeV
+        L (float): baseline, km
+        rho (float): electron density rho * Ye, g/cm^3
+    Returns:
+        P (array): (nParam, nE)
+    """
+    s12, s13, s23, dm21, dm32, dcp = [np.atleast_1d(np.asarray(x, dtype=float))[:, None]
+                                      for x in (s12, s13, s23, dm21, dm32, dcp)]
+    E = np.atleast_1d(np.asarray(Ebins, dtype=float))[None, :]
+    shape = np.broadcast(s12, E).shape
+
+    # antineutrinos: conjugated mixing matrix and opposite matter potential
+    sign = -1.0 if fromFlavor < 0 else 1.0
+    delta = sign * dcp
+
+    sin12, sin13, sin23 = np.sqrt(s12), np.sqrt(s13), np.sqrt(s23)
+    cos12, cos13, cos23 = np.sqrt(1 - s12), np.sqrt(1 - s13), np.sqrt(1 - s23)
+    phase = np.exp(1j * delta)
+
+    U = np.zeros(s12.shape + (3, 3), dtype=complex)
+    U[..., 0, 0] = cos12 * cos13
+    U[..., 0, 1] = sin12 * cos13
+    U[..., 0, 2] = sin13 * np.conj(phase)
+    U[..., 1, 0] = -sin12 * cos23 - cos12 * sin23 * sin13 * phase
+    U[..., 1, 1] = cos12 * cos23 - sin12 * sin23 * sin13 * phase
+    U[..., 1, 2] = sin23 * cos13
+    U[..., 2, 0] = sin12 * sin23 - cos12 * cos23 * sin13 * phase
+    U[..., 2, 1] = -cos12 * sin23 - sin12 * cos23 * sin13 * phase
+    U[..., 2, 2] = cos23 * cos13
+
+    # masses squared relative to m1, see BargerPropagator::SetMNS
+    dm31 = np.where(dm32 > 0, dm32 + dm21, dm32)
+    masses = np.stack(np.broadcast_arrays(np.zeros_like(dm21), dm21, dm31), axis=-1)
+
+    # 2E H in the flavor basis, eV^2
+    M = np.einsum('...ij,...j,...kj->...ik', U, masses, np.conj(U))
+    M = np.broadcast_to(M, shape + (3, 3)).copy()
+    M[..., 0, 0] += sign * tworttwoGf * E * rho
+
+    eigval, eigvec = np.linalg.eigh(M)
+    evolution = np.exp(-1j * LoEfac * eigval * L / E[..., None])
+    amplitude = np.einsum('...i,...i,...i->...',
+                          eigvec[..., abs(toFlavor) - 1, :],
+                          evolution,
+                          np.conj(eigvec[..., abs(fromFlavor) - 1, :]))
+    return np.abs(amplitude)**2
+
+
 class oscProb:
+    """ oscillation probability for flux_fitter
+
+    Methods:
+        -- __init__(): set flavors, oscillation parameters and engine:
+                       prob3 (BargerPropagator through Prob3 library) 
+                       or numpy (three_flavor_prob(), constant density
+                       of the Earth crust along the same path)
+        -- load(): probabilities for energies
+        -- load_grid(): probabilities for a grid of oscillation parameters
+        -- compare_engines(): max difference of prob3 and numpy engines
+    """
     def __init__(self, fromFlavor, toFlavor,
                  s12 = 0.297, s13 = 0.0215, s23 = 0.53,
-                 dm21 = 7.37e-5, dm32 = 2.46e-3, dcp = -np.pi/2):
+                 dm21 = 7.37e-5, dm32 = 2.46e-3, dcp = -np.pi/2,
+                 engine = "prob3"):
 
         DipAngle_degrees = 5.8 # what is it? 
         LengthParam = np.cos(np.radians(90.0 + DipAngle_degrees))
@@ -33,21 +126,95 @@ class oscProb:
         self.dm21 = dm21
         self.dm32 = dm32
         self.dcp = dcp
-        
-        self.bp = BargerPropagator()
-        self.bp.DefinePath(LengthParam, 0)
+
+        # the path of BargerPropagator.DefinePath(LengthParam, 0): 
+        # a chord through the outer layer of the Earth
+        self.L = -2 * REarth * LengthParam
+        self.rho = crustDensity * electronFraction
+
+        assert engine in ("prob3", "numpy"), f"engine is prob3/numpy, not {engine}"
+        self.engine = engine
+        if self.engine == "prob3":
+            self.bp = BargerPropagator()
+            self.bp.DefinePath(LengthParam, 0)
 
         self.fromFlavor = prob3Codes[fromFlavor]
         self.toFlavor = prob3Codes[toFlavor]
         
         
     def load(self, Ebins):
-        P = []
-        for E in Ebins:
-            self.bp.SetMNS(self.s12, self.s13, self.s23,
-                           self.dm21, self.dm32, self.dcp,
-                           E, True, self.fromFlavor)
-            self.bp.propagate(self.toFlavor)
-            prob = self.bp.GetProb(self.fromFlavor, self.toFlavor)
-            P.append(prob)
-        return np.array(P)
+        return self.load_grid(Ebins)[0]
+
+    def load_grid(self, Ebins, **params):
+        """
+        Oscillation probabilities for a grid of oscillation parameters.
+        Each set of parameters is calculated once per process (see _probCache).
+
+        Args:
+            Ebins (array): energies
+            **params: arrays (or numbers) of s12, s13, s23, dm21, dm32, dcp;
+                      they are broadcast together, the missing ones are taken from self
+        Returns:
+            P (array): (nParam, nE)
+        """
+        Ebins = np.asarray(Ebins, dtype=float)
+        unknown = set(params) - set(oscParams)
+        assert not unknown, f"unknown oscillation parameters: {unknown}"
+
+        grid = np.broadcast_arrays(*[np.atleast_1d(params.get(name, getattr(self, name)))
+                                     for name in oscParams])
+        grid = [np.ravel(values).astype(float) for values in grid]
+
+        P = np.empty((grid[0].size, Ebins.size))
+        keys = [(self.engine, self.fromFlavor, self.toFlavor) + values + (Ebins.tobytes(),)
+                for values in zip(*grid)]
+        missing = [i for i, key in enumerate(keys) if key not in _probCache]
+        if missing:
+            newP = self._propagate([values[missing] for values in grid], Ebins)
+            for i, prob in zip(missing, newP):
+                _probCache[keys[i]] = prob
+
+        for i, key in enumerate(keys):
+            P[i] = _probCache[key]
+        return P
+
+    def _propagate(self, grid, Ebins):
+        """
+        Returns:
+            P (array): (nParam, nE) for nParam values of each parameter in grid
+        """
+        if self.engine == "numpy":
+            return three_flavor_prob(self.fromFlavor, self.toFlavor, *grid,
+                                     Ebins, self.L, self.rho)
+
+        P = np.empty((grid[0].size, Ebins.size))
+        for i, (s12, s13, s23, dm21, dm32, dcp) in enumerate(zip(*grid)):
+            for j, E in enumerate(Ebins):
+                self.bp.SetMNS(s12, s13, s23,
+                               dm21, dm32, dcp,
+                               E, True, self.fromFlavor)
+                self.bp.propagate(self.toFlavor)
+                P[i, j] = self.bp.GetProb(self.fromFlavor, self.toFlavor)
+        return P
+
+    def compare_engines(self, Ebins, **params):
+        """
+        Max absolute difference of probabilities from prob3 and numpy engines
+        for the same energies and parameters (see load_grid()). 
+        Both engines use the same constants and path, 
+        so it should be below 1e-6 for any parameters.
+        """
+        engine = self.engine
+        if not hasattr(self, "bp"):
+            LengthParam = -self.L / (2 * REarth)
+            self.bp = BargerPropagator()
+            self.bp.DefinePath(LengthParam, 0)
+
+        try:
+            self.engine = "prob3"
+            P_prob3 = self.load_grid(Ebins, **params)
+            self.engine = "numpy"
+            P_numpy = self.load_grid(Ebins, **params)
+        finally:
+            self.engine = engine
+        return np.max(np.abs(P_prob3 - P_numpy))
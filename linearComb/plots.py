@@ -1,19 +1,44 @@
 import matplotlib.pyplot as plt
 import os
 import numpy as np
+from render import RenderQueue
 
-def plot_nom_fluxes_coeff(reg, fitter, type_target=False, 
-                          woHC=False, reg_wo=False, ratio=True):
+def nom_fluxes_coeff_data(reg, fitter, type_target=False, woHC=False, reg_wo=False):
         """
-        Plot nominal LC and FD fluxes
+        Calculate LC fluxes and coefficients for plot_nom_fluxes_coeff()
 
-        Args:
-            reg (float): a reg parameter
-            fitter (object): class object
-            type_target (str): FHC/RHC
-            woHC (bool): plot additional curves w/o the lower HC in LC 
-            reg_wo (float): a reg parameter for them 
-            ratio (bool): plot ratio of DUNE-PRISM LC flux and FD flux or not
+        Returns:
+            data (dict): arrays and labels of the page (see nom_fluxes_coeff_page())
+        """
+
+        data = {"file_set": fitter.f,
+                "Energy": fitter.Ebins,
+                "EnergyEdges": fitter.EbinEdges,
+                "OAbins": fitter.OABins,
+                "OAEdges": fitter.OAEdges,
+                "Ebounds": fitter.Ebounds}
+
+        if type_target == 'FHC':
+            FD_unosc = fitter.FD_nom
+        elif type_target == 'RHC':
+            FD_unosc = fitter.FD_RHC_nom 
+        data["FD_unosc"] = FD_unosc
+
+        if woHC:
+            # calculate coeffs for w/o HC
+            _, data["fluxPred_wo"], data["coeff_wo"] = fitter.calc_coeffs(reg_wo, FD_unosc, useHC=False)   
+
+        # calculate coeffs
+        data["target"], data["fluxPred"], c = fitter.calc_coeffs(reg, FD_unosc)
+        data["coeff"] = c[:-1]
+        return data
+
+def nom_fluxes_coeff_page(data, reg, type_target=False, ratio=True):
+        """
+        Page with nominal LC and FD fluxes from nom_fluxes_coeff_data()
+
+        Returns:
+            fig (figure)
         """
 
         colors = {"orange": "#F19E54", 
@@ -27,28 +52,20 @@ def plot_nom_fluxes_coeff(reg, fitter, type_target=False,
             ax.grid(which='both', color = 'grey')
             ax.legend(fontsize=11)  
 
-        file_set = fitter.f
-        Energy = fitter.Ebins
-        EnergyEdges = fitter.EbinEdges
-        OAbins = fitter.OABins
-        OAEdges = fitter.OAEdges
-
-        Ebounds = fitter.Ebounds
-
-        if type_target == 'FHC':
-            FD_unosc = fitter.FD_nom
-        elif type_target == 'RHC':
-            FD_unosc = fitter.FD_RHC_nom 
+        file_set = data["file_set"]
+        Energy = data["Energy"]
+        EnergyEdges = data["EnergyEdges"]
+        OAbins = data["OAbins"]
+        OAEdges = data["OAEdges"]
+        Ebounds = data["Ebounds"]
+        FD_unosc = data["FD_unosc"]
+        target, fluxPred, coeff = data["target"], data["fluxPred"], data["coeff"]
+        attrib = ("PRISM+HC", colors["orange"])
 
+        woHC = "coeff_wo" in data
         if woHC:
-            # calculate coeffs for w/o HC
-            target_wo, fluxPred_wo, coeff_wo = fitter.calc_coeffs(reg_wo, FD_unosc, useHC=False)   
+            fluxPred_wo, coeff_wo = data["fluxPred_wo"], data["coeff_wo"]
             attrib_wo = ("PRISM off-axis", colors["blue"])     
-    
-        # calculate coeffs
-        target, fluxPred, c = fitter.calc_coeffs(reg, FD_unosc)
-        coeff = c[:-1]
-        attrib = ("PRISM+HC", colors["orange"])
 
         y_units = r"$\Phi, \nu \mathrm{s} / \mathrm{cm^2} / \mathrm{POT} / \mathrm{GeV}$"
 
@@ -92,10 +109,10 @@ def plot_nom_fluxes_coeff(reg, fitter, type_target=False,
 
         if file_set == 'old':
             f_s = "OLD"
-            lamb = r'$\lambda = 5$ x $10^{-9}$'
         else:
             f_s = 'NEW'
-            lamb = r'$\lambda = 4$ x $10^{-9}$'
+        mantissa, exponent = f"{reg:.1e}".split("e")
+        lamb = r'$\lambda = ' + f'{float(mantissa):g}' + r'$ x $10^{' + str(int(exponent)) + r'}$'
     
         if ratio:
             ax3.set_axis_off()
@@ -103,17 +120,37 @@ def plot_nom_fluxes_coeff(reg, fitter, type_target=False,
             ax3.text(0.2, 0.65, r'Target: $\nu_{\mu}$ ' + type_target, fontsize=14)
             ax3.text(0.2, 0.4, lamb, fontsize=13)
 
-        plt.tight_layout()
+        fig.tight_layout()
+        return fig
 
-        if file_set == 'old':
+def plot_nom_fluxes_coeff(reg, fitter, type_target=False, 
+                          woHC=False, reg_wo=False, ratio=True, queue=None):
+        """
+        Plot nominal LC and FD fluxes
+
+        Args:
+            reg (float): a reg parameter
+            fitter (object): class object
+            type_target (str): FHC/RHC
+            woHC (bool): plot additional curves w/o the lower HC in LC 
+            reg_wo (float): a reg parameter for them 
+            ratio (bool): plot ratio of DUNE-PRISM LC flux and FD flux or not
+            queue (RenderQueue): add the page to the queue, save it right away if None
+        """
+
+        data = nom_fluxes_coeff_data(reg, fitter, type_target, woHC, reg_wo)
+
+        if fitter.f == 'old':
             file_set = 'Old'
         else:
             file_set = 'New'
 
         dir_plt = os.path.join("images", file_set) 
-        if not os.path.isdir(dir_plt):
-            os.mkdir(dir_plt)
-
         path_name = os.path.join(dir_plt, type_target + "_nom_coeff.pdf")
-        plt.savefig(path_name)
-        print(f"Saved in {path_name}")
+
+        render_now = queue is None
+        if render_now:
+            queue = RenderQueue(jobs=1)
+        queue.add(path_name, nom_fluxes_coeff_page, data, reg, type_target, ratio)
+        if render_now:
+            queue.run()
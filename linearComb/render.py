@@ -0,0 +1,110 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing as mp
+import os
+
+
+def default_jobs():
+    """ number of workers: RENDER_JOBS or number of cores """
+    return int(os.environ.get("RENDER_JOBS", os.cpu_count()))
+
+
+def _init_worker():
+    # workers only write files
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def render_file(path, pages):
+    """
+    render matplotlib pages as one (multi-page) pdf file,
+    every figure is closed right after it is saved
+
+    Args:
+        path (str): pdf file
+        pages (list): [(page, args, kwargs)], page(*args, **kwargs) returns a figure
+    Returns:
+        path (str)
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    dir_plt = os.path.dirname(path)
+    if dir_plt:
+        os.makedirs(dir_plt, exist_ok=True)
+
+    with PdfPages(path) as pdf:
+        for page, args, kwargs in pages:
+            fig = page(*args, **kwargs)
+            try:
+                pdf.savefig(fig, facecolor="white")
+            finally:
+                plt.close(fig)
+    return path
+
+
+class RenderQueue:
+    """
+    Queue of pages made from precomputed arrays,
+    pages are rendered by process pool (Agg backend) in run()
+
+    Methods:
+        -- add(): add matplotlib page to pdf file
+        -- add_job(): add function which writes its own file (e.g. ROOT canvas)
+        -- run(): render all files, clear the queue
+    """
+    def __init__(self, jobs=None):
+        """
+        Args:
+            jobs (int): number of workers, 1 - in this process
+                        (RENDER_JOBS or number of cores by default)
+        """
+        self.jobs = jobs or default_jobs()
+        # {pdf file: [(page, args, kwargs)]}, pages are kept in order
+        self.files = {}
+        # functions writing their own files: [(func, args, kwargs)]
+        self.writers = []
+
+    def add(self, path, page, *args, **kwargs):
+        """
+        Args:
+            path (str): pdf file, pages of the same file are saved in one pdf
+            page (func): module-level function, page(*args, **kwargs) returns a figure
+        """
+        self.files.setdefault(path, []).append((page, args, kwargs))
+
+    def add_job(self, func, *args, **kwargs):
+        """
+        Args:
+            func (func): module-level function, func(*args, **kwargs) writes a file
+                         and returns its name
+        """
+        self.writers.append((func, args, kwargs))
+
+    def _tasks_(self):
+        return ([(render_file, (path, pages), {}) for path, pages in self.files.items()]
+                + self.writers)
+
+    def run(self):
+        """
+        Returns:
+            paths (list): written files
+        """
+        tasks = self._tasks_()
+        self.files, self.writers = {}, []
+
+        paths = []
+        if self.jobs == 1 or len(tasks) < 2:
+            for func, args, kwargs in tasks:
+                paths.append(func(*args, **kwargs))
+                print(f"Saved in {paths[-1]}")
+            return paths
+
+        # ROOT is not fork-safe
+        context = mp.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(self.jobs, len(tasks)), mp_context=context,
+                                 initializer=_init_worker) as pool:
+            futures = [pool.submit(func, *args, **kwargs) for func, args, kwargs in tasks]
+            for future in as_completed(futures):
+                paths.append(future.result())
+                print(f"Saved in {paths[-1]}")
+        return paths
@@ -0,0 +1,76 @@
+import numpy as np
+
+
+def _root_buffer(buf, size):
+    """
+    copy a ROOT double* buffer (TArrayD, Sumw2, ...) into a numpy array
+    """
+    buf.reshape((size,))
+    return np.array(buf, dtype = float, copy = True)
+
+def _root_cells(TH, cells, flow = False):
+    """
+    reshape the flat cell buffer of a TH1/TH2 (with under/overflow)
+    to (NbinsX, NbinsY), or (NbinsX + 2, NbinsY + 2) with under/overflow bins
+    (1 instead of NbinsY for TH1)
+    """
+    nX = TH.GetNbinsX()
+    nY = TH.GetNbinsY() + 2 if TH.GetDimension() > 1 else 1
+    # ROOT stores the cells x-fastest: global bin = x + (nX + 2)*y
+    cells = cells.reshape(nY, nX + 2).T
+    if flow:
+        return cells.copy()
+    if TH.GetDimension() == 1:
+        return cells[1:nX+1]
+    return cells[1:nX+1, 1:nY-1]
+
+def root_contents(TH, flow = False):
+    """
+    bin contents of a TH1D/TH2D as an array of shape (NbinsX, NbinsY)
+    without under/overflow bins (with them if flow, [xNum, yNum] as in ROOT)
+    """
+    return _root_cells(TH, _root_buffer(TH.GetArray(), TH.GetNcells()), flow)
+
+def root_errors(TH, flow = False):
+    """
+    bin errors of a TH1D/TH2D, the same shape as root_contents()
+    """
+    sumw2 = TH.GetSumw2()
+    if sumw2.GetSize():
+        cells = _root_buffer(sumw2.GetArray(), TH.GetNcells())
+    else:
+        # without Sumw2 ROOT takes the sqrt of the bin content
+        cells = np.abs(_root_buffer(TH.GetArray(), TH.GetNcells()))
+    return np.sqrt(_root_cells(TH, cells, flow))
+
+def root_to_cells(array):
+    """
+    (NbinsX + 2, NbinsY + 2) -> flat ROOT cells for SetContent()/SetError()
+    """
+    return np.ascontiguousarray(np.asarray(array, dtype = float).T).ravel()
+
+def root_axis_edges(axis):
+    """
+    all bin edges of a TAxis, for fixed and variable binning
+    """
+    nBins = axis.GetNbins()
+    xbins = axis.GetXbins()
+    if xbins.GetSize():
+        return _root_buffer(xbins.GetArray(), nBins + 1)
+    return np.linspace(axis.GetXmin(), axis.GetXmax(), nBins + 1)
+
+def root_to_edges(TH):
+    """
+    bin edges (NbinsX + 1, NbinsY + 1) of x and y axes
+    """
+    return (root_axis_edges(TH.GetXaxis()),
+            root_axis_edges(TH.GetYaxis()))
+
+def find_bins(x, nBins, xMin, xMax):
+    """
+    TAxis.FindBin() for fixed binning: 0 - underflow, nBins + 1 - overflow
+    """
+    bins = 1 + np.floor(nBins*(x - xMin)/(xMax - xMin)).astype(int)
+    bins[x < xMin] = 0
+    bins[x >= xMax] = nBins + 1
+    return bins
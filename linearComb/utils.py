@@ -1,18 +1,28 @@
 import numpy as np
-from ROOT import *
+from scipy import sparse
+from root_arrays import root_contents, root_errors, root_to_edges
 
 
-def root_to_array(TH, binEdges = [], method = "average"):
-    shape = [TH.GetNbinsX(),
-             TH.GetNbinsY()]
-    con = np.ndarray(shape)
-    for i in range(shape[0]):
-        for j in range(shape[1]):
-                con[i,j] = TH.GetBinContent(i+1, j+1)
-    con = con.squeeze()
+def root_to_array(TH, binEdges = [], method = "average", errors = False):
+    con = root_contents(TH).squeeze()
+    con = resample(con, root_to_axes(TH), binEdges, method)
+    if errors:
+        err = resample_errors(root_errors(TH).squeeze(), root_to_axes(TH), binEdges, method)
+        return con, err
+    return con
+
+def resample(con, oldBins, binEdges = [], method = "average"):
+    """
+    change binning of hist contents (from root-file or columnar file)
 
+    Args:
+        con (array): contents
+        oldBins (tuple): bin centers of each axis of con
+        binEdges (list): new bin edges of each axis (nothing to change if empty)
+        method (str): average/interpolate
+    """
     if list(binEdges):
-        oldBins = list(root_to_axes(TH))
+        oldBins = list(oldBins)
         if method == "average":
             for axis, theseBinEdges in enumerate(binEdges):
                 con = average_by_bin_edge(con, oldBins[axis], theseBinEdges, axis = axis)
@@ -22,20 +32,44 @@ def root_to_array(TH, binEdges = [], method = "average"):
                 con = np.interp(theseBinCenters, oldBins[axis], con)
     return con
 
+def resample_errors(err, oldBins, binEdges = [], method = "average"):
+    """
+    change binning of hist errors as resample() does for contents:
+    errors of averaged bins are added in quadrature, 
+    interpolated errors are interpolated as contents
+
+    Args:
+        err (array): errors
+        oldBins (tuple): bin centers of each axis of err
+        binEdges (list): new bin edges of each axis (nothing to change if empty)
+        method (str): average/interpolate
+    """
+    if list(binEdges):
+        oldBins = list(oldBins)
+        if method == "average":
+            for axis, theseBinEdges in enumerate(binEdges):
+                sumw2 = rebin_by_bin_edge(err**2, oldBins[axis], theseBinEdges, axis = axis)
+                nInside = bin_assignment(oldBins[axis], theseBinEdges)[2]
+                shape = [1]*sumw2.ndim
+                shape[axis] = nInside.size
+                err = np.sqrt(sumw2)/nInside.reshape(shape)
+        elif method == "interpolate":
+            for axis, theseBinEdges in enumerate(binEdges):
+                theseBinCenters = 0.5*(theseBinEdges[:-1] + theseBinEdges[1:])
+                err = np.interp(theseBinCenters, oldBins[axis], err)
+    return err
+
 def root_to_axes(TH, where = 'mid'):
-    axes = [TH.GetXaxis(),
-            TH.GetYaxis()]
-    shape = [TH.GetNbinsX(),
-             TH.GetNbinsY()]
+    xEdges, yEdges = root_to_edges(TH)
     if where == 'mid':
-        xBins = np.array([axes[0].GetBinCenter(i+1) for i in range(shape[0])])
-        yBins = np.array([axes[1].GetBinCenter(i+1) for i in range(shape[1])])
+        xBins = 0.5*(xEdges[:-1] + xEdges[1:])
+        yBins = 0.5*(yEdges[:-1] + yEdges[1:])
     elif where == 'pre':
-        xBins = np.array([axes[0].GetBinLowEdge(i+1) for i in range(shape[0])])
-        yBins = np.array([axes[1].GetBinLowEdge(i+1) for i in range(shape[1])])
+        xBins = xEdges[:-1]
+        yBins = yEdges[:-1]
     elif where == 'post':
-        xBins = np.array([axes[0].GetBinUpEdge(i+1) for i in range(shape[0])])
-        yBins = np.array([axes[1].GetBinUpEdge(i+1) for i in range(shape[1])])
+        xBins = xEdges[1:]
+        yBins = yEdges[1:]
     else:
         raise KeyError("options are 'mid', 'pre', and 'post'")
     return (xBins, yBins)
@@ -47,45 +81,130 @@ def rebin(oldHist, rebinF, axis = 0):
     newHist = np.sum(oldHist.reshape(newShape), axis = axis + 1)
     return newHist
 
+# bins of old bin centers: {(oldBinCenters, newBinEdges, side): (order, starts, nInside)}
+_bin_assignments = {}
+
+def bin_assignment(oldBinCenters, newBinEdges, side = 'left'):
+    """
+    assignment of old bins to new bins, computed once per binning
+
+    Args:
+        oldBinCenters (array): old bin centers
+        newBinEdges (array): new bin edges
+        side (str): left -- leftEdge <= center < rightEdge,
+                    right -- leftEdge < center <= rightEdge
+    Returns:
+        order (array): old bins inside new bins, grouped by new bin
+        starts (array): first position in order of each new bin
+        nInside (array): number of old bins in each new bin
+    """
+    oldBinCenters = np.ascontiguousarray(oldBinCenters, dtype = float)
+    newBinEdges = np.ascontiguousarray(newBinEdges, dtype = float)
+    key = (oldBinCenters.tobytes(), newBinEdges.tobytes(), side)
+    if key not in _bin_assignments:
+        # searchsorted side is opposite to the closed edge
+        newBins = np.searchsorted(newBinEdges, oldBinCenters, 
+                                  side = 'left' if side == 'right' else 'right') - 1
+        inside = np.flatnonzero((newBins >= 0) & (newBins < newBinEdges.size - 1))
+        order = inside[np.argsort(newBins[inside], kind = 'stable')]
+        nInside = np.bincount(newBins[inside], minlength = newBinEdges.size - 1)
+        starts = np.concatenate(([0], np.cumsum(nInside)[:-1]))
+        _bin_assignments[key] = (order, starts, nInside)
+    return _bin_assignments[key]
+
 def rebin_by_bin_edge(oldHist, oldBinCenters, newBinEdges, axis = 0, side = 'left'):
-    # WARNING: Only works for axis = 0 or 1 for now!
-    oldShape = oldHist.shape
-    newShape = oldShape[:axis] + tuple((newBinEdges.size-1,)) + oldShape[axis+1:]
-    newHist = np.ndarray(newShape)
-    if axis == 0:
-        for i, (leftEdge, rightEdge) in enumerate(zip(newBinEdges[:-1], newBinEdges[1:])):
-            if side == 'right':
-                newHist[i] = np.sum(oldHist[np.logical_and(leftEdge < oldBinCenters,
-                                                           oldBinCenters <= rightEdge)],
-                                    axis = 0)
-            else:
-                newHist[i] = np.sum(oldHist[np.logical_and(leftEdge <= oldBinCenters,
-                                                           oldBinCenters < rightEdge)],
-                                    axis = 0)    
-        return newHist
-    elif axis == 1:
-        for i in range(newHist.shape[0]):
-            newHist[i] = rebin_by_bin_edge(oldHist[i], oldBinCenters, newBinEdges)
-        return newHist
+    """
+    sum old bins with centers inside new bins along any axis
+    """
+    order, starts, nInside = bin_assignment(oldBinCenters, newBinEdges, side)
+    oldHist = np.asarray(oldHist)
+    newShape = oldHist.shape[:axis] + (nInside.size,) + oldHist.shape[axis+1:]
+    if not order.size:
+        return np.zeros(newShape)
+
+    inside = np.take(oldHist, order, axis = axis)
+    newHist = np.add.reduceat(inside, np.minimum(starts, order.size - 1), axis = axis)
+    # reduceat takes one element for an empty bin 
+    empty = [slice(None)]*oldHist.ndim
+    empty[axis] = nInside == 0
+    newHist[tuple(empty)] = 0
+    return newHist.astype(float, copy = False)
 
 
 def average(oldHist, rebinF, **kwargs):
     return rebin(oldHist, rebinF, **kwargs)/float(rebinF)
 
 def average_by_bin_edge(oldHist, oldBinCenters, newBinEdges, axis = 0, side = 'left'):
-    rebinned = rebin_by_bin_edge(oldHist, oldBinCenters, newBinEdges, axis = axis)
-    for i, (leftEdge, rightEdge) in enumerate(zip(newBinEdges[:-1], newBinEdges[1:])):
-        if side == 'right':
-            nInside = np.sum(np.logical_and(leftEdge < oldBinCenters,
-                                            oldBinCenters <= rightEdge),
-                             dtype = float)
-        else:
-            nInside = np.sum(np.logical_and(leftEdge <= oldBinCenters,
-                                            oldBinCenters < rightEdge),
-                             dtype = float)
-
-        if axis == 0:
-            rebinned[i] /= nInside
-        elif axis == 1:
-            rebinned[:, i] /= nInside
-    return rebinned
+    rebinned = rebin_by_bin_edge(oldHist, oldBinCenters, newBinEdges, axis = axis, side = side)
+    nInside = bin_assignment(oldBinCenters, newBinEdges, side)[2]
+    shape = [1]*rebinned.ndim
+    shape[axis] = nInside.size
+    return rebinned/nInside.reshape(shape)
+
+
+class Rebinner:
+    """ rebin many hists with the same binning: 
+        one sparse matrix (new bins x old bins) per axis
+
+    Methods:
+        -- for_axes(): Rebinner for old bin centers and new bin edges, 
+                       made once per binning
+        -- apply(): rebin the last axes of hist or stack of hists
+    """
+    _rebinners = {}
+
+    def __init__(self, oldBinCenters, newBinEdges, method = "average", side = 'left'):
+        """
+        Args:
+            oldBinCenters (tuple): old bin centers of each axis
+            newBinEdges (tuple): new bin edges of each axis
+            method (str): average/sum (see average_by_bin_edge()/rebin_by_bin_edge())
+            side (str): see bin_assignment()
+        """
+        assert len(oldBinCenters) == len(newBinEdges), "one set of edges per axis"
+        assert method in ("average", "sum"), f"method is average/sum, not {method}"
+        self.shape = tuple(len(centers) for centers in oldBinCenters)
+        self.matrices = []
+        self.empty = []
+        # as in average_by_bin_edge(): 0/0 for new bins without old bins
+        self.empty_bins_nan = method == "average"
+        for centers, edges in zip(oldBinCenters, newBinEdges):
+            order, starts, nInside = bin_assignment(centers, edges, side)
+            newBins = np.repeat(np.arange(nInside.size), nInside)
+            weights = np.ones(order.size)
+            if method == "average":
+                weights /= nInside[newBins]
+            self.matrices.append(sparse.csr_matrix((weights, (newBins, order)),
+                                                   shape = (nInside.size, len(centers))))
+            self.empty.append(nInside == 0)
+
+    @classmethod
+    def for_axes(cls, oldBinCenters, newBinEdges, method = "average", side = 'left'):
+        key = (tuple(np.asarray(centers, dtype = float).tobytes() for centers in oldBinCenters),
+               tuple(np.asarray(edges, dtype = float).tobytes() for edges in newBinEdges),
+               method, side)
+        if key not in cls._rebinners:
+            cls._rebinners[key] = cls(oldBinCenters, newBinEdges, method, side)
+        return cls._rebinners[key]
+
+    def apply(self, hists):
+        """
+        Args:
+            hists (array): (..., nOld_0, nOld_1, ...), 
+                           e.g. (nE, nOA) or (nUniv, nE, nOA)
+        Returns:
+            (array): (..., nNew_0, nNew_1, ...)
+        """
+        hists = np.asarray(hists, dtype = float)
+        nAxes = len(self.matrices)
+        assert hists.shape[hists.ndim - nAxes:] == self.shape, \
+            f"hist binning {hists.shape} doesn't match {self.shape}"
+
+        for i, (matrix, empty) in enumerate(zip(self.matrices, self.empty)):
+            axis = hists.ndim - nAxes + i
+            moved = np.moveaxis(hists, axis, 0)
+            rebinned = matrix @ moved.reshape(moved.shape[0], -1)
+            if self.empty_bins_nan and empty.any():
+                rebinned[empty] = np.nan
+            hists = np.moveaxis(rebinned.reshape((-1,) + moved.shape[1:]), 0, axis)
+        return np.ascontiguousarray(hists)
@@ -1,35 +1,98 @@
 from ROOT import TFile
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
 import os
+import sys
 
-def choose_file(shift_name):
+branch_name = "Unosc_numu_flux_DUNEPRISM_LAr_center"
+modes = ["neutrino", "antineutrino"]
+dot = ".root"
+
+
+def input_dir():
+    """ directory with "neutrino/" and "antineutrino/": INPUT_FLUX_DIR or .. """
+    return os.environ.get("INPUT_FLUX_DIR", "..")
+
+def hist_names(shift_names, neutrino):
     """
-    Used Pierce's files: 
-      -- nominal flux: OfficialEngDesignSept2021_neutrino_LAr_center.root
-      -- shifted fluxes: (DecayPipeRadius)_neg(pos)_1_sigma_(anti)neutrino_LAr_center.root
-    
-    
-    Extracts hist "Unosc_numu_flux_DUNEPRISM_LAr_center" and renames as the initial file. 
+    names of input files (and output hists) of the mode:
+    pos and neg shifts of every name without duplicates
+    """
+    names = []
+    for shift_name in shift_names:
+        for how in ["pos", "neg"]:
+            new_name = shift_name.replace('neutrino', neutrino)
+            new_name = new_name.replace('neg', how)
+            if new_name not in names:
+                names.append(new_name)
+    return names
+
+def extract_mode(neutrino, shift_names, input_path=None):
+    """
+    Extracts hist "Unosc_numu_flux_DUNEPRISM_LAr_center" of all shifts of the mode
+    and renames as the initial file, the output file is opened once.
     Saves here as "(anti)neutrino_branches.root"
 
+    Args:
+        neutrino (str): neutrino/antineutrino
+        shift_names (list): names of neutrino files (see choose_file())
+        input_path (str): directory with "neutrino/" and "antineutrino/" (see input_dir())
+    Returns:
+        output file (str)
     """
+    neutrino_flux_path = os.path.join(input_path or input_dir(), neutrino)
+    output_name = neutrino + "_branches" + dot
 
-    for neutrino in ["neutrino", "antineutrino"]:
-        for how in ["pos", "neg"]:
-            # should be local directories "neutrino/" and "antineutrino/"
-            neutrino_flux_path = os.path.join("/home/anna/mywork/prism/project", neutrino)
-            dot = ".root"
-            branch_name = "Unosc_numu_flux_DUNEPRISM_LAr_center"
+    output_hist = TFile(output_name, "update")
+    for new_name in hist_names(shift_names, neutrino):
+        neutrino_branches = TFile(os.path.join(neutrino_flux_path, new_name+dot))
+        TH = neutrino_branches.Get(branch_name)
+        if not TH:
+            raise Exception(f"There is no {branch_name} in {neutrino_branches.GetName()}")
 
-            new_name = shift_name.replace('neutrino', neutrino)
-            new_name = new_name.replace('neg', how)
-            neutrino_branches = TFile(os.path.join(neutrino_flux_path, new_name+dot))
-            TH = neutrino_branches.Get(branch_name)
+        output_hist.cd()
+        TH.Write(new_name, option=2)
+        neutrino_branches.Close()
+
+    output_hist.Close()
+    return output_name
 
-            output_hist = TFile(neutrino + "_branches" + dot, "update")
-            TH.Write(new_name, option=2)
+def extract(shift_names, input_path=None, jobs=None):
+    """
+    Extracts hists of all shifts for both modes (see extract_mode()),
+    the modes are made in parallel
+
+    Args:
+        jobs (int): number of workers, 1 - sequentially
+    """
+    jobs = jobs or min(len(modes), os.cpu_count())
+
+    if jobs == 1:
+        for neutrino in modes:
+            print(f"Saved in {extract_mode(neutrino, shift_names, input_path)}")
+        return
+
+    # ROOT is not fork-safe
+    context = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+        futures = [pool.submit(extract_mode, neutrino, shift_names, input_path)
+                   for neutrino in modes]
+        for future in futures:
+            print(f"Saved in {future.result()}")
+
+def choose_file(shift_name):
+    """
+    Used Pierce's files:
+      -- nominal flux: OfficialEngDesignSept2021_neutrino_LAr_center.root
+      -- shifted fluxes: (DecayPipeRadius)_neg(pos)_1_sigma_(anti)neutrino_LAr_center.root
+
+
+    Extracts hist "Unosc_numu_flux_DUNEPRISM_LAr_center" and renames as the initial file.
+    Saves here as "(anti)neutrino_branches.root"
+
+    """
 
-            output_hist.Close()
-            neutrino_branches.Close()
+    extract([shift_name], jobs=1)
 
 
 if __name__ == "__main__":
@@ -41,8 +104,5 @@ if __name__ == "__main__":
     HW = "HornWaterLayerThickness"
     PB = "ProtonBeamRadius"
 
-    choose_file(nom)
-    choose_file(DP + rest_part)
-    choose_file(HC + rest_part)
-    choose_file(HW + rest_part)
-    choose_file(PB + rest_part)
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    extract([nom] + [shift + rest_part for shift in [DP, HC, HW, PB]], jobs=jobs)
@@ -1,37 +1,56 @@
 from ROOT import TFile
 import os
+import sys
+import numpy as np
 import one_dim_utils
+from render import RenderQueue
 
-# calculate ND flux ratios of nominal and shifted fluxes at a particular position 
-if 'N_FLUX_FILE' in os.environ:
-    neutrino_flux_file = os.environ['N_FLUX_FILE']
-else:
-    neutrino_flux_file = "neutrino_branches.root"
-
-if 'AN_FLUX_FILE' in os.environ:
-    antineutrino_flux_file = os.environ['AN_FLUX_FILE']
-else:
-    antineutrino_flux_file = "antineutrino_branches.root"
-
-
-neutrino_branches = TFile(neutrino_flux_file)
-antineutrino_branches = TFile(antineutrino_flux_file)
-
-D = ("LAr center", "LAr_center")
-loc_pos = [0, 10]
-uncert_types = {"R decay pipe": "DecayPipeRadius_pos_1_sigma_neutrino_",
-                "Horn current": "HornCurrent_pos_1_sigma_neutrino_", 
-                "Water thickness": "HornWaterLayerThickness_pos_1_sigma_neutrino_", 
-                "Proton beam radius": "ProtonBeamRadius_pos_1_sigma_neutrino_"}
-
-for loc in loc_pos:
-    # return list of nominal fluxes: [FHC, RHC]
-    nom = one_dim_utils.nominal_flux(neutrino_branches, antineutrino_branches, loc, "OfficialEngDesignSept2021_neutrino_"+D[1])
-    for UT in uncert_types.keys():
-        # return list of one type shifted fluxes: [FHC+, FHC-, RHC+, RHC-]  
-        current_uncert = one_dim_utils.one_uncert(neutrino_branches, antineutrino_branches, loc, uncert_types[UT]+D[1])
-        # return energy range, ratios and create plots
-        ratios = one_dim_utils.two_ratios(nom, current_uncert, UT, loc, D[0])
-
-neutrino_branches.Close()
-antineutrino_branches.Close()
+
+if __name__ == "__main__":
+    # calculate ND flux ratios of nominal and shifted fluxes at a particular position 
+    if 'N_FLUX_FILE' in os.environ:
+        neutrino_flux_file = os.environ['N_FLUX_FILE']
+    else:
+        neutrino_flux_file = "neutrino_branches.root"
+
+    if 'AN_FLUX_FILE' in os.environ:
+        antineutrino_flux_file = os.environ['AN_FLUX_FILE']
+    else:
+        antineutrino_flux_file = "antineutrino_branches.root"
+
+
+    neutrino_branches = TFile(neutrino_flux_file)
+    antineutrino_branches = TFile(antineutrino_flux_file)
+
+    D = ("LAr center", "LAr_center")
+    loc_pos = [0, 10]
+    uncert_types = {"R decay pipe": "DecayPipeRadius_pos_1_sigma_neutrino_",
+                    "Horn current": "HornCurrent_pos_1_sigma_neutrino_", 
+                    "Water thickness": "HornWaterLayerThickness_pos_1_sigma_neutrino_", 
+                    "Proton beam radius": "ProtonBeamRadius_pos_1_sigma_neutrino_"}
+
+    # every branch is read once for all positions: [FHC, RHC] of (nPos, nE)
+    nom_all = one_dim_utils.nominal_flux(neutrino_branches, antineutrino_branches, loc_pos, "OfficialEngDesignSept2021_neutrino_"+D[1])
+    uncert_all = {UT: one_dim_utils.one_uncert(neutrino_branches, antineutrino_branches, loc_pos, uncert_types[UT]+D[1])
+                  for UT in uncert_types.keys()}
+
+    # stacked fluxes: nominal (nPos, nMode, nE), shifted (nUncert, nPos, nSign, nMode, nE)
+    stacked = [one_dim_utils.stack_fluxes(nom_all, uncert_all[UT]) for UT in uncert_types.keys()]
+    x, nominal, nominal_err = stacked[0][:3]
+    shifted = np.stack([fluxes[3] for fluxes in stacked])
+    shifted_err = np.stack([fluxes[4] for fluxes in stacked])
+
+    # ratios and double ratios of all uncertainties at all positions in one call
+    ratios = one_dim_utils.ratio_tensors(nominal, nominal_err, shifted, shifted_err)
+
+    # pages are rendered in parallel (RENDER_JOBS or number of cores)
+    queue = RenderQueue(int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    for j, UT in enumerate(uncert_types.keys()):
+        for i, loc in enumerate(loc_pos):
+            # plots of one uncertainty at one position
+            fluxes = (nominal[i], nominal_err[i], shifted[j, i], shifted_err[j, i])
+            one_dim_utils.plot_two_ratios(x, fluxes, [r[j, i] for r in ratios], UT, loc, D[0], queue)
+
+    neutrino_branches.Close()
+    antineutrino_branches.Close()
+    queue.run()
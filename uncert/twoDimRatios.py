@@ -1,53 +1,53 @@
 from ROOT import *
 import os
+import sys
 import numpy as np
+from utils import cut_arrays, rebin2d, divide, arrays_to_hist
+# utils adds linearComb/ to sys.path
+from render import RenderQueue
 gROOT.SetBatch(True)
 
 
-def cut_hists(hist, title, ERange=[0.5, 8], LocRange=[-4, 30]):
+def cut_hists(hist, ERange=[0.5, 8], LocRange=[-4, 30], rebin=(30, 10)):
     """
-    extract an initial hist, cut x and y axes, return new hist
+    extract an initial hist, cut x and y axes and rebin them (as Rebin2D())
+
+    Returns:
+        contents (array): (nX, nY)
+        xedges, yedges (array): bin edges
+    """
+
+    contents, xedges, yedges = cut_arrays(hist, ERange, LocRange)
+    return rebin2d(contents, xedges, yedges, *rebin)
+
+def ratio_tensors(nominal, shifted):
     """
+    ratios of shifted and nominal numu fluxes in FHC and RHC 
+    and double ratios FHC ratio / RHC ratio for all shifts at once
+
+    Args:
+        nominal (array): (2, nX, nY) FHC, RHC nominal fluxes
+        shifted (array): (..., 2, nX, nY) FHC, RHC shifted fluxes
+    Returns:
+        ratio (array): (..., 2, nX, nY) sigma/nominal for FHC, RHC
+        double_ratio (array): (..., nX, nY) FHC ratio / RHC ratio
+    """
+
+    ratio = divide(shifted, nominal)
+    double_ratio = divide(ratio[..., 0, :, :], ratio[..., 1, :, :])
+    return ratio, double_ratio
 
-    TAX = hist.GetXaxis()
-    TAY = hist.GetYaxis()
-    TAZ = hist.GetZaxis()
-
-    xMinBin = TAX.FindBin(ERange[0])
-    xMaxBin = TAX.FindBin(ERange[1])
-    xBins = xMaxBin - xMinBin
-
-    yMinBin = TAY.FindBin(LocRange[0])
-    yMaxBin = TAY.FindBin(LocRange[1])
-    yBins = yMaxBin - yMinBin
-
-    shape = [xBins, yBins]
-    flux = np.ndarray(shape)
-    err = np.ndarray(shape)
-    energy = np.ndarray(shape[0])
-    loc = np.ndarray(shape[1])
-    
-    cut_hist = TH2D(title, title, shape[0], ERange[0], ERange[1], 
-                                  shape[1], LocRange[0], LocRange[1])
-
-    for j, yNum in enumerate(range(yMinBin, yMaxBin)):
-        for i, xNum in enumerate(range(xMinBin, xMaxBin)):
-            energy[i] = TAX.GetBinCenter(xNum)
-            loc[j] = TAY.GetBinCenter(yNum)
-            flux[i,j] = hist.GetBinContent(xNum, yNum)
-            cut_hist.Fill(energy[i], loc[j], flux[i,j])
-
-    yLabel = TAY.GetTitle()
-    zLabel = TAZ.GetTitle()
-    cut_hist.GetYaxis().SetTitle(yLabel)
-
-    xLabel = TAX.GetTitle()
-    cut_hist.GetXaxis().SetTitle(xLabel)
-    return cut_hist
-
-def TwoDimRatios(nom, sigma, nom_bar, sigma_bar, detector, uncert, sign_type):
+def TwoDimRatios(ratio, double_ratio, xedges, yedges, labels, detector, uncert, sign_type):
     """
     plot 2D ratios of nominal and shifted numu fluxes: in FHC (signal), in RHC (bkg) 
+    and their double ratio (see ratio_tensors())
+
+    Args:
+        ratio (array): (2, nX, nY) FHC, RHC ratios
+        double_ratio (array): (nX, nY)
+        labels (tuple): x and y axis titles
+    Returns:
+        path (str): pdf file
     """
 
     if sign_type == "pos":
@@ -55,40 +55,30 @@ def TwoDimRatios(nom, sigma, nom_bar, sigma_bar, detector, uncert, sign_type):
     elif sign_type == "neg":
         sign = "-"
 
-    nom_reb = nom.Clone()
-    sigma_reb = sigma.Clone()
-    nom_reb.Rebin2D(30, 10)
-    sigma_reb.Rebin2D(30, 10)
-    
-    nom_bar_reb = nom_bar.Clone()
-    sigma_bar_reb = sigma_bar.Clone()
-    nom_bar_reb.Rebin2D(30, 10)
-    sigma_bar_reb.Rebin2D(30, 10)
-    
     c1 = TCanvas()
 
     gStyle.SetPalette(kRainBow)   
     c1.Divide(2,2)
-    ratio = sigma_reb.Clone()
-    ratio.SetStats(0)
-    ratio.SetTitle("#nu_{#mu} FHC ratio: sigma/nominal")
-    ratio.Divide(nom_reb)
-    c1.cd(1)
-    ratio.Draw("COLZ")
-
-    ratio_bar = sigma_bar_reb.Clone()
-    ratio_bar.SetStats(0)
-    ratio_bar.SetTitle("#nu_{#mu} RHC ratio: sigma/nominal")
-    ratio_bar.Divide(nom_bar_reb)
-    c1.cd(2)
-    ratio_bar.Draw("COLZ")
-
-    double_ratio = ratio.Clone()
-    double_ratio.SetStats(0)
-    double_ratio.SetTitle("Double ratio: #nu_{#mu} FHC ratio / #nu_{#mu} RHC ratio")
-    double_ratio.Divide(ratio_bar)
-    c1.cd(3)
-    double_ratio.Draw("COLZ")
+
+    titles = ["#nu_{#mu} FHC ratio: sigma/nominal",
+              "#nu_{#mu} RHC ratio: sigma/nominal",
+              "Double ratio: #nu_{#mu} FHC ratio / #nu_{#mu} RHC ratio"]
+    maps = [ratio[0], ratio[1], double_ratio]
+
+    # the same z range for all maps
+    zSmall = min(z_map.min() for z_map in maps)
+    zBig = max(z_map.max() for z_map in maps)
+
+    hists = []
+    for pad, (title, z_map) in enumerate(zip(titles, maps)):
+        hist = arrays_to_hist(uncert + sign_type + str(pad), title, z_map, xedges, yedges)
+        hist.SetStats(0)
+        hist.GetXaxis().SetTitle(labels[0])
+        hist.GetYaxis().SetTitle(labels[1])
+        hist.SetAxisRange(zSmall, zBig, "Z")
+        c1.cd(pad + 1)
+        hist.Draw("COLZ")
+        hists.append(hist)
 
     c1.cd(4)
     tex = TLatex(0.3,0.7,"#splitline{"+detector+"}{" +uncert+" "+sign+" 1#sigma}")
@@ -96,24 +86,12 @@ def TwoDimRatios(nom, sigma, nom_bar, sigma_bar, detector, uncert, sign_type):
     tex.SetTextSize(0.06)
     tex.Draw()
 
-    zMin = ratio.GetMinimum()
-    zMax = ratio.GetMaximum()
-    zMin1 = ratio_bar.GetMinimum()
-    zMax1 = ratio_bar.GetMaximum()
-    zMin2 = double_ratio.GetMinimum()
-    zMax2 = double_ratio.GetMaximum()
-    zMinim = [zMin, zMin1, zMin2]
-    zMaxim = [zMax, zMax1, zMax2]
-    zSmall = min(zMinim)
-    zBig = max(zMaxim)
-    ratio.SetAxisRange(zSmall, zBig, "Z");
-    ratio_bar.SetAxisRange(zSmall, zBig, "Z");
-    double_ratio.SetAxisRange(zSmall, zBig, "Z");
-
     dir_plt = "imgs/twodim/"
-    if not os.path.isdir(dir_plt):
-        os.mkdir(dir_plt)
-    c1.SaveAs(dir_plt + detector + " " + uncert + " " + sign_type + ".pdf")
+    os.makedirs(dir_plt, exist_ok=True)
+    path = dir_plt + detector + " " + uncert + " " + sign_type + ".pdf"
+    c1.SaveAs(path)
+    c1.Close()
+    return path
 
 
 if __name__ == "__main__":
@@ -130,28 +108,31 @@ if __name__ == "__main__":
                     "Proton Beam Radius": "ProtonBeamRadius_pos_1_sigma_"}
 
     # open two mode files
-    neutrino_branches = TFile(neutrino_flux_file)
-    antineutrino_branches = TFile(antineutrino_flux_file)
-
-    # extract nominal hist
-    nom = neutrino_branches.Get("OfficialEngDesignSept2021_"+neutrino[0]+"_"+D[1])
-    nom_bar = antineutrino_branches.Get("OfficialEngDesignSept2021_"+neutrino[1]+"_"+D[1])
-
-    # cut them
-    nom_cut = cut_hists(nom, 'nomin')
-    nom_cut_bar = cut_hists(nom_bar, 'nomin_bar')
-
-    for sign in signs:
-        for UT in uncert_types.keys():
-            uncert_types[UT] = uncert_types[UT].replace("pos", sign) 
-            # extract shifted hists 
-            sigma = neutrino_branches.Get(uncert_types[UT]+neutrino[0]+"_"+D[1])
-            sigma_bar = antineutrino_branches.Get(uncert_types[UT]+neutrino[1]+"_"+D[1])
-            # cut them
-            sigma_cut = cut_hists(sigma, UT+sign+neutrino[0])
-            sigma_cut_bar = cut_hists(sigma_bar, UT+sign+neutrino[1])
-            # plot 2D ratios
-            TwoDimRatios(nom_cut, sigma_cut, nom_cut_bar, sigma_cut_bar, D[0], UT, sign)
-
-    neutrino_branches.Close()
-    antineutrino_branches.Close()
+    branches = [TFile(neutrino_flux_file), TFile(antineutrino_flux_file)]
+
+    # nominal hists: cut and rebinned once, (2, nX, nY)
+    nom_hists = [mode_branches.Get("OfficialEngDesignSept2021_" + mode + "_" + D[1])
+                 for mode, mode_branches in zip(neutrino, branches)]
+    nom_cut = [cut_hists(nom) for nom in nom_hists]
+    nominal = np.stack([contents for contents, _, _ in nom_cut])
+    _, xedges, yedges = nom_cut[0]
+    labels = (nom_hists[0].GetXaxis().GetTitle(), nom_hists[0].GetYaxis().GetTitle())
+
+    # shifted hists: (nSign, nUncert, 2, nX, nY)
+    shifted = np.stack([[[cut_hists(mode_branches.Get(uncert_types[UT].replace("pos", sign) + mode + "_" + D[1]))[0]
+                          for mode, mode_branches in zip(neutrino, branches)]
+                         for UT in uncert_types]
+                        for sign in signs])
+
+    for mode_branches in branches:
+        mode_branches.Close()
+
+    # all ratios and double ratios at once
+    ratio, double_ratio = ratio_tensors(nominal, shifted)
+
+    # plot 2D ratios in parallel (RENDER_JOBS or number of cores)
+    queue = RenderQueue(int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    for i, sign in enumerate(signs):
+        for j, UT in enumerate(uncert_types):
+            queue.add_job(TwoDimRatios, ratio[i, j], double_ratio[i, j], xedges, yedges, labels, D[0], UT, sign)
+    queue.run()
@@ -0,0 +1,83 @@
+import numpy as np
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "linearComb"))
+from root_arrays import root_contents, root_errors, root_to_edges, root_to_cells, find_bins
+
+
+def hist_to_arrays(hist):
+    """
+    contents and errors of TH1D/TH2D without under/overflow bins
+    (shape (NbinsX, NbinsY)), bin edges of x and y axes
+    """
+    return (root_contents(hist), root_errors(hist)) + root_to_edges(hist)
+
+def cut_arrays(hist, ERange, LocRange):
+    """
+    cut x and y axes of 2D hist as a new hist with fixed bins in ERange x LocRange
+    filled at bin centers of the initial bins (the same bins as in TH2D.Fill())
+
+    Returns:
+        contents (array): (nX, nY) without under/overflow bins
+        xedges, yedges (array): bin edges
+    """
+    contents, _, xedges, yedges = hist_to_arrays(hist)
+    TAX = hist.GetXaxis()
+    TAY = hist.GetYaxis()
+
+    # initial bins from FindBin(min) to FindBin(max) - 1
+    xNums = np.arange(TAX.FindBin(ERange[0]), TAX.FindBin(ERange[1]))
+    yNums = np.arange(TAY.FindBin(LocRange[0]), TAY.FindBin(LocRange[1]))
+    xBins, yBins = xNums.size, yNums.size
+
+    energy = 0.5*(xedges[xNums - 1] + xedges[xNums])
+    loc = 0.5*(yedges[yNums - 1] + yedges[yNums])
+
+    cut = np.zeros((xBins + 2, yBins + 2))
+    np.add.at(cut, np.ix_(find_bins(energy, xBins, *ERange),
+                          find_bins(loc, yBins, *LocRange)),
+              contents[np.ix_(xNums - 1, yNums - 1)])
+
+    return (cut[1:-1, 1:-1],
+            np.linspace(ERange[0], ERange[1], xBins + 1),
+            np.linspace(LocRange[0], LocRange[1], yBins + 1))
+
+def rebin2d(contents, xedges, yedges, nGroupX, nGroupY):
+    """
+    merge nGroupX x nGroupY bins as TH2.Rebin2D():
+    the last bins which don't make a full group are dropped
+
+    Args:
+        contents (array): (..., nX, nY)
+    Returns:
+        contents (array): (..., nX//nGroupX, nY//nGroupY)
+        xedges, yedges (array): new bin edges
+    """
+    nX = contents.shape[-2] // nGroupX
+    nY = contents.shape[-1] // nGroupY
+    contents = contents[..., :nX*nGroupX, :nY*nGroupY]
+    shape = contents.shape[:-2] + (nX, nGroupX, nY, nGroupY)
+    return (contents.reshape(shape).sum(axis=(-3, -1)),
+            xedges[:nX*nGroupX + 1:nGroupX], yedges[:nY*nGroupY + 1:nGroupY])
+
+def divide(numerator, denominator):
+    """
+    numerator/denominator with broadcasting, 0 where denominator is 0 (as TH1.Divide())
+    """
+    numerator, denominator = np.broadcast_arrays(numerator, denominator)
+    return np.divide(numerator, denominator,
+                     out=np.zeros(numerator.shape), where=denominator != 0)
+
+def arrays_to_hist(name, title, contents, xedges, yedges):
+    """
+    TH2D with contents (nX, nY) and bin edges, filled in one call
+    """
+    from ROOT import TH2D
+    nX, nY = contents.shape
+    hist = TH2D(name, title, nX, np.ascontiguousarray(xedges, dtype=float),
+                nY, np.ascontiguousarray(yedges, dtype=float))
+    cells = np.zeros((nX + 2, nY + 2))
+    cells[1:-1, 1:-1] = contents
+    hist.SetContent(root_to_cells(cells))
+    hist.SetEntries(contents.size)
+    return hist